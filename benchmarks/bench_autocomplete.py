@@ -0,0 +1,76 @@
+"""
+Benchmark of the autocomplete index against the linear scan it replaces.
+
+Builds an index of thousands of labels and measures queries of various lengths,
+as well as incremental updates. Run from the repository root with:
+
+    uv run python -m benchmarks.bench_autocomplete
+"""
+
+import random
+import string
+import time
+import timeit
+
+from utils.autocomplete import MAX_CHOICES, AutocompleteIndex
+
+WORDS = [
+    "examen",
+    "partiel",
+    "projet",
+    "réseau",
+    "sécurité",
+    "cryptographie",
+    "système",
+    "rendu",
+    "soutenance",
+    "analyse",
+    "forensic",
+    "pentest",
+]
+QUERIES = ["", "e", "pr", "sec", "crypto", "rendu tp", "zzz"]
+
+
+def make_labels(count):
+    random.seed(42)
+    labels = set()
+    while len(labels) < count:
+        words = random.sample(WORDS, 2)
+        suffix = "".join(random.choices(string.ascii_uppercase + string.digits, k=4))
+        labels.add(f"{words[0].capitalize()} {words[1]} {suffix}")
+    return list(labels)
+
+
+def timed(function, number):
+    return min(timeit.repeat(function, number=number, repeat=5)) / number
+
+
+def linear_scan(labels, query):
+    return [label for label in labels if query.lower() in label.lower()][:MAX_CHOICES]
+
+
+def main():
+    for count in (1_000, 5_000, 20_000):
+        labels = make_labels(count)
+
+        start = time.perf_counter()
+        index = AutocompleteIndex(labels)
+        build = (time.perf_counter() - start) * 1e3
+
+        print(f"\n{count} labels (index built in {build:.1f} ms)")
+        print(f"{'query':>12} {'linear µs':>12} {'index µs':>12}")
+        for query in QUERIES:
+            linear = timed(lambda q=query, labels=labels: linear_scan(labels, q), 50)
+            indexed = timed(lambda q=query, index=index: index.search(q), 50)
+            print(f"{query!r:>12} {linear * 1e6:12.1f} {indexed * 1e6:12.1f}")
+
+        def update(index=index, label="Projet réseau NEW1"):
+            index.add(label)
+            index.remove(label)
+
+        per_update = timed(update, 200)
+        print(f"{'add+remove':>12} {'':>12} {per_update * 1e6:12.1f}")
+
+
+if __name__ == "__main__":
+    main()
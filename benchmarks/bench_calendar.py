@@ -0,0 +1,104 @@
+"""
+Benchmark of the Google Calendar client setup paid by every calendar sync cycle.
+
+Compares building the service on every cycle, as the calendar cog used to, with the
+long-lived `CalendarService` reusing it. Service account credentials are generated
+for the benchmark, and their token refresh is simulated without network access, so no
+credentials file is needed. Run from the repository root with:
+
+    uv run python -m benchmarks.bench_calendar
+"""
+
+import datetime
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import google.auth
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from google.auth.exceptions import RefreshError
+from google.oauth2 import service_account
+from googleapiclient.discovery import build
+
+import cogs.calendar as calendar
+
+CYCLES = 50
+
+
+def write_service_account(directory):
+    """Write the key file of a made-up service account, returning its path."""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    path = os.path.join(directory, "credentials.json")
+    with open(path, "w") as file:
+        json.dump(
+            {
+                "type": "service_account",
+                "project_id": "bench",
+                "private_key_id": "bench",
+                "private_key": pem.decode(),
+                "client_email": "bench@bench.iam.gserviceaccount.com",
+                "client_id": "0",
+                "token_uri": "https://oauth2.googleapis.com/token",
+            },
+            file,
+        )
+    return path
+
+
+def refresh(credentials, _):
+    """Token refresh as Google answers it, rejecting credentials without scopes."""
+    if not credentials.scopes:
+        raise RefreshError("invalid_scope: Invalid OAuth scope or ID token audience provided.")
+    credentials.refreshes = getattr(credentials, "refreshes", 0) + 1
+    credentials.token = "token"
+    now = datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+    credentials.expiry = now + datetime.timedelta(hours=1)
+
+
+def rebuild():
+    credentials, _ = google.auth.load_credentials_from_file(
+        calendar.GOOGLE_CREDENTIALS_JSON, scopes=calendar.SCOPES
+    )
+    return build("calendar", "v3", credentials=credentials)
+
+
+def measure(setup):
+    durations = []
+    for _ in range(CYCLES):
+        start = time.perf_counter()
+        setup()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def main():
+    service_account.Credentials.refresh = refresh
+
+    with tempfile.TemporaryDirectory() as directory:
+        calendar.GOOGLE_CREDENTIALS_JSON = write_service_account(directory)
+
+        service = calendar.CalendarService()
+        print(f"{CYCLES} sync cycles")
+        print(f"{'service':>10} {'first ms':>9} {'median ms':>10} {'total ms':>9}")
+        for name, setup in [("rebuilt", rebuild), ("cached", service.get)]:
+            durations = measure(setup)
+            print(
+                f"{name:>10} {durations[0] * 1000:9.1f} "
+                f"{statistics.median(durations) * 1000:10.3f} {sum(durations) * 1000:9.1f}"
+            )
+
+        # The token refreshed must be the one the service sends
+        used = service.service._http.credentials
+        print(f"service token refreshed: {used is service.credentials and used.refreshes == 1}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Micro-benchmark of the /reminder date parser.
+
+Compares the precompiled fast path, the memoized dateparser fallback and a cold
+dateparser call, for the fast path inputs as well. The memo is keyed by the input and
+the day, and a reminder date is rarely typed twice the same day, so most fallback parses
+are cold: the fast path is measured against those, not against a memo hit. Run from the
+repository root with:
+
+    uv run python -m benchmarks.bench_dateparse
+"""
+
+import time
+import timeit
+from datetime import datetime
+
+from utils import dates
+
+FAST_INPUTS = ["24/12/2025 14:30", "demain 14h", "vendredi", "tomorrow 2pm", "dans 3 jours"]
+FALLBACK_INPUTS = ["15 mars", "le 3 avril à 10h", "march 15th 5pm", "1er décembre"]
+
+
+def per_call(statement, number):
+    return min(timeit.repeat(statement, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    now = datetime.now()
+
+    start = time.perf_counter()
+    dates.warm_up()
+    print(f"dateparser warm-up: {(time.perf_counter() - start) * 1e3:.1f} ms")
+
+    def fast():
+        for text in FAST_INPUTS:
+            dates.parse_date(text, now)
+
+    def cached():
+        for text in FALLBACK_INPUTS:
+            dates.parse_date(text, now)
+
+    def cold():
+        dates._cached_dateparser.cache_clear()
+        for text in FALLBACK_INPUTS:
+            dates.parse_date(text, now)
+
+    def fast_cold():
+        # What the fast path inputs would cost on a memo miss without it
+        for text in FAST_INPUTS:
+            dates._dateparser(text, now)
+
+    cached()
+    print(f"fast path:         {per_call(fast, 2000) / len(FAST_INPUTS):9.2f} µs/parse")
+    print(f"cached fallback:   {per_call(cached, 2000) / len(FALLBACK_INPUTS):9.2f} µs/parse")
+    print(f"cold fallback:     {per_call(cold, 20) / len(FALLBACK_INPUTS):9.2f} µs/parse")
+    print(f"fast inputs, cold: {per_call(fast_cold, 20) / len(FAST_INPUTS):9.2f} µs/parse")
+
+
+if __name__ == "__main__":
+    main()
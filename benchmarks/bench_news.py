@@ -0,0 +1,180 @@
+"""
+Benchmark of a news poll over hundreds of feeds served by a local fixture server.
+
+Every feed answers after a random latency, and a few of them never answer in time.
+Measures the time to poll all the feeds once at several concurrency limits, the
+number of requests in flight at the same time, the messages needed to post the new
+entries and the peak memory used. Run from
+the repository root with:
+
+    uv run python -m benchmarks.bench_news
+"""
+
+import asyncio
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from aiohttp import web
+from discord import Object
+
+import cogs.news as news
+from config import NEWS_CONCURRENCY, ConfigManager
+from database import Article, ArticleIndex, SentEntry, db
+from utils.http import HttpClient
+from utils.scheduler import TokenBucket
+
+FEEDS = 300
+ENTRIES = 20
+# Share of the feeds answering after the fetch timeout
+DEAD_FEEDS = 0.02
+PORT = 8765
+# Per-feed timeout, shorter than the default to keep the benchmark quick
+TIMEOUT = 2
+
+
+def make_feed(index):
+    now = time.time()
+    items = "".join(
+        # Titles of random words, so the entries are not folded as duplicates
+        f"<item><title>{' '.join(f'word{random.randrange(10000)}' for _ in range(6))}</title>"
+        f"<guid>{index}-{i}</guid>"
+        f"<link>http://127.0.0.1/{index}/{i}</link>"
+        f"<description>&lt;p&gt;Description of the entry {i}&lt;/p&gt;</description>"
+        f"<pubDate>{time.strftime('%a, %d %b %Y %H:%M:%S +0000', time.gmtime(now - i * 3600))}"
+        "</pubDate></item>"
+        for i in range(ENTRIES)
+    )
+    return (
+        f'<?xml version="1.0"?><rss version="2.0"><channel><title>Feed {index}</title>'
+        f"{items}</channel></rss>"
+    ).encode()
+
+
+class FixtureServer:
+    def __init__(self):
+        random.seed(42)
+        self.documents = {i: make_feed(i) for i in range(FEEDS)}
+        self.latencies = {i: random.uniform(0.01, 0.2) for i in range(FEEDS)}
+        for i in random.sample(range(FEEDS), int(FEEDS * DEAD_FEEDS)):
+            self.latencies[i] = TIMEOUT + 1
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def handle(self, request):
+        index = int(request.match_info["index"])
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latencies[index])
+        finally:
+            self.in_flight -= 1
+        return web.Response(body=self.documents[index], content_type="application/rss+xml")
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/{index}", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, "127.0.0.1", PORT).start()
+
+
+class Channel:
+    def __init__(self):
+        self.messages = 0
+        self.embeds = 0
+
+    async def send(self, embeds):
+        self.messages += 1
+        self.embeds += len(embeds)
+        return Object(self.messages)
+
+    def get_partial_message(self, message_id):
+        return self
+
+    async def edit(self, embeds):
+        pass
+
+
+class Bot:
+    def __init__(self):
+        self.channel = Channel()
+        # Every fixture feed is served by the same host
+        self.http_client = HttpClient(per_host=FEEDS)
+
+    async def wait_until_ready(self):
+        pass
+
+    def get_channel(self, _):
+        return self.channel
+
+
+async def poll_all(server, concurrency, trace=False):
+    """Poll every feed once with a fresh cog, returning the elapsed time and peak memory."""
+    # Every run posts the same entries
+    for model in (SentEntry, ArticleIndex, Article):
+        model.delete().execute()
+    bot = Bot()
+    cog = news.News(bot)
+    cog.feed_state = {}
+    cog.feeds = {}
+    for i in range(FEEDS):
+        url = f"http://127.0.0.1:{PORT}/{i}"
+        cog.feeds[url] = {"url": url, "name": f"Feed {i}", "color": 0, "channel": None}
+    cog.semaphore = asyncio.Semaphore(concurrency)
+    # The request budget is not what is measured here
+    cog.budget = TokenBucket(FEEDS, FEEDS)
+    await bot.http_client.start()
+    await cog.cog_load()
+    cog.scheduler.stop()
+
+    server.max_in_flight = 0
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    await asyncio.gather(*[await cog.start_poll(url) for url in cog.feeds])
+    elapsed = time.perf_counter() - start
+    await asyncio.gather(*cog.deliveries.values())
+    peak = tracemalloc.get_traced_memory()[1] if trace else 0
+    tracemalloc.stop()
+
+    await cog.cog_unload()
+    await bot.http_client.close()
+    return elapsed, peak, bot.channel
+
+
+async def run():
+    server = FixtureServer()
+    await server.start()
+    news.NEWS_FETCH_TIMEOUT = TIMEOUT
+
+    slowest = max(latency for latency in server.latencies.values() if latency < TIMEOUT)
+    print(f"{FEEDS} feeds, {ENTRIES} entries each, slowest live feed {slowest:.2f} s")
+    print(f"{'concurrency':>12} {'poll s':>8} {'in flight':>10} {'embeds':>8} {'messages':>9}")
+    for concurrency in sorted({4, NEWS_CONCURRENCY, 64}):
+        elapsed, _, channel = await poll_all(server, concurrency)
+        print(
+            f"{concurrency:12d} {elapsed:8.2f} {server.max_in_flight:10d} "
+            f"{channel.embeds:8d} {channel.messages:9d}"
+        )
+
+    # Tracing slows everything down, memory is measured on a separate run
+    _, peak, _ = await poll_all(server, NEWS_CONCURRENCY, trace=True)
+    print(f"peak memory at concurrency {NEWS_CONCURRENCY}: {peak / 1024 / 1024:.1f} MB")
+
+    await server.runner.cleanup()
+
+
+def main():
+    # Work on a scratch database rather than the bot's
+    with tempfile.TemporaryDirectory() as directory:
+        db.init(os.path.join(directory, "bench.db"))
+        ConfigManager.path = os.path.join(directory, "config.json")
+        ConfigManager.load()
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmark of the event loop lag caused by parsing large news feeds.
+
+Large feeds, with long HTML descriptions, are parsed the way the news cog used to
+(feedparser in a thread, then the HTML cleaned on the event loop) and the way it does
+now (parsed and cleaned in worker processes returning slim records). A ticker task
+measures how late the event loop wakes it up meanwhile. Run from the repository root
+with:
+
+    uv run python -m benchmarks.bench_parse
+"""
+
+import asyncio
+import html
+import multiprocessing
+import re
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import feedparser
+
+from config import NEWS_PARSE_WORKERS
+from utils.feeds import parse_feed
+
+FEEDS = 24
+ENTRIES = 200
+# Paragraphs of each entry description
+PARAGRAPHS = 20
+# Interval (in seconds) of the ticker measuring the event loop lag
+TICK = 0.005
+
+
+def make_feed(index):
+    paragraph = (
+        "&lt;p&gt;Une &lt;b&gt;vulnérabilité&lt;/b&gt; affecte le &lt;a href='#'&gt;"
+        "produit&lt;/a&gt; &amp;amp; ses dépendances.&lt;/p&gt;"
+    )
+    items = "".join(
+        f"<item><title>Entry {index}-{i}</title><guid>{index}-{i}</guid>"
+        f"<link>http://127.0.0.1/{index}/{i}</link>"
+        f"<description>{paragraph * PARAGRAPHS}</description>"
+        "<pubDate>Mon, 06 Jan 2025 10:00:00 +0000</pubDate>"
+        "<category>Sécurité</category></item>"
+        for i in range(ENTRIES)
+    )
+    return (
+        f'<?xml version="1.0"?><rss version="2.0"><channel><title>Feed {index}</title>'
+        f"{items}</channel></rss>"
+    ).encode()
+
+
+def clean_html(raw_html):
+    """The cleaning the cog did on the event loop, for every entry."""
+    clean = re.compile("<.*?>")
+    return html.unescape(re.sub(clean, "", raw_html)).strip()
+
+
+async def old_parse(content):
+    feed = await asyncio.to_thread(feedparser.parse, content)
+    return [clean_html(entry.get("description", "")) for entry in feed.entries]
+
+
+async def new_parse(content, parser):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(parser, parse_feed, content, {})
+
+
+async def measure(parse, documents):
+    """Parse every document concurrently, returning the elapsed time and the loop lags."""
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(TICK)
+            lags.append(time.perf_counter() - start - TICK)
+
+    task = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    await asyncio.gather(*[parse(document) for document in documents])
+    elapsed = time.perf_counter() - start
+    done.set()
+    await task
+    return elapsed, lags
+
+
+async def run():
+    documents = [make_feed(i) for i in range(FEEDS)]
+    size = sum(len(document) for document in documents) / len(documents) / 1024
+    print(f"{FEEDS} feeds of {ENTRIES} entries, {size:.0f} kB each")
+
+    parser = ProcessPoolExecutor(
+        NEWS_PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn")
+    )
+    # Workers are started once by the cog, their startup is not measured
+    await asyncio.gather(*[new_parse(documents[0], parser) for _ in range(NEWS_PARSE_WORKERS)])
+
+    print(f"{'parser':>26} {'total s':>8} {'max lag ms':>11} {'p99 lag ms':>11}")
+    for name, parse in [
+        ("thread + loop cleaning", old_parse),
+        (f"{NEWS_PARSE_WORKERS} worker processes", lambda content: new_parse(content, parser)),
+    ]:
+        elapsed, lags = await measure(parse, documents)
+        p99 = statistics.quantiles(lags, n=100)[-1] if len(lags) > 1 else lags[0]
+        print(f"{name:>26} {elapsed:8.2f} {max(lags) * 1000:11.1f} {p99 * 1000:11.1f}")
+
+    parser.shutdown()
+
+
+def main():
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
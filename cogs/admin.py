@@ -5,6 +5,7 @@ from discord.ext.commands import Context
 from loguru import logger
 
 from ui.announcement import Announcement
+from utils.render import paginate, render
 
 
 class Admin(commands.Cog, name="admin"):
@@ -197,6 +198,35 @@ class Admin(commands.Cog, name="admin"):
         embed = discord.Embed(description=message, color=0xBEBEFE)
         await context.send(embed=embed)
 
+    @commands.hybrid_command(
+        name="http",
+        description="Shows the latency and errors of the outbound HTTP requests, per host.",
+    )
+    @commands.is_owner()
+    async def http(self, context: Context) -> None:
+        """
+        Shows the latency and errors of the outbound HTTP requests, per host.
+
+        :param context: The hybrid command context.
+        """
+        metrics = sorted(
+            self.bot.http_client.metrics.items(), key=lambda item: item[1].requests, reverse=True
+        )
+        fields = [
+            (
+                host or "?",
+                f"{host_metrics.requests} requests, {host_metrics.errors} errors\n"
+                f"p50 {host_metrics.percentile(50) * 1000:.0f} ms, "
+                f"p95 {host_metrics.percentile(95) * 1000:.0f} ms",
+            )
+            for host, host_metrics in metrics
+        ]
+        if not fields:
+            fields.append(("No requests", "Nothing was requested yet."))
+
+        for page in paginate(render([{"title": "Outbound HTTP", "fields": fields}])):
+            await context.send(embeds=page)
+
     @app_commands.command(description="Efface un nombre de messages.")
     @app_commands.describe(limit="The number of messages that should be deleted by the bot")
     @commands.is_owner()
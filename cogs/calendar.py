@@ -1,88 +1,165 @@
+import asyncio
 import datetime
+import hashlib
+import json
 import time
 
 import google.auth
 import requests
+from discord import EntityType, HTTPException, Object, PrivacyLevel
 from discord.ext import commands, tasks
+from google.auth.exceptions import RefreshError
+from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from loguru import logger
 
 from config import (
     DAYS_IN_FUTURE,
-    DISCORD_BOT_TOKEN,
     DISCORD_CHANNEL_ID,
     DISCORD_GUILD_ID,
     GOOGLE_CALENDAR_ID,
     GOOGLE_CREDENTIALS_JSON,
+    SYNC_CONCURRENCY,
     SYNC_INTERVAL,
     ConfigManager,
 )
 
+# Delay (in seconds) between two full syncs, picking up the events entering the time window
+FULL_SYNC_INTERVAL = 24 * 3600
+# Cycles a change failing to reach Discord is tried again in, before giving up on it
+MAX_ATTEMPTS = 5
+# Events fetched per request to Google Calendar, at most 2500
+PAGE_SIZE = 250
+# Access requested to the Google Calendar API
+SCOPES = ["https://www.googleapis.com/auth/calendar"]
+# Time left before the Google access token expires at which it is refreshed
+TOKEN_REFRESH_MARGIN = datetime.timedelta(minutes=5)
 
-def get_google_calendar_service():
+
+class CalendarService:
     """
-    Set up the Google Calendar API service using the provided credentials.
+    Google Calendar API service, built once from the provided credentials and reused.
+
+    The access token is refreshed shortly before it expires, and the service is only
+    rebuilt when Google rejects the credentials, so HTTP connections are kept alive
+    between cycles. Blocking, meant to be called from a thread.
     """
-    credentials, _ = google.auth.load_credentials_from_file(GOOGLE_CREDENTIALS_JSON)
-    service = build("calendar", "v3", credentials=credentials)
-    return service
+
+    def __init__(self):
+        self.credentials = None
+        self.service = None
+        # Connections to the token endpoint, kept alive between refreshes
+        self.session = requests.Session()
+        # Time (in seconds) spent building the service and refreshing the token last call
+        self.overhead = 0
+
+    def get(self):
+        start = time.perf_counter()
+        if self.service is None:
+            # Scoped from the start, so the service uses these credentials rather than a
+            # scoped copy, and refreshing them refreshes its token
+            self.credentials, _ = google.auth.load_credentials_from_file(
+                GOOGLE_CREDENTIALS_JSON, scopes=SCOPES
+            )
+            self.service = build("calendar", "v3", credentials=self.credentials)
+            logger.info("Google Calendar service built")
+
+        # Expiry dates are naive UTC datetimes in google-auth
+        expiry = self.credentials.expiry
+        now = datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+        if expiry is None or expiry - now < TOKEN_REFRESH_MARGIN:
+            self.credentials.refresh(Request(self.session))
+        self.overhead = time.perf_counter() - start
+        return self.service
+
+    def call(self, function, *args):
+        """
+        Return `function(service, *args)`, rebuilding the service once if Google
+        rejects the credentials.
+        """
+        try:
+            return function(self.get(), *args)
+        except (RefreshError, HttpError) as e:
+            if isinstance(e, HttpError) and e.resp.status != 401:
+                raise
+            logger.warning(f"Google Calendar credentials rejected, rebuilding the service: {e}")
+            self.service = None
+            return function(self.get(), *args)
 
 
-def get_upcoming_events(service):
+def get_upcoming_events(service, sync_token=None, page_token=None):
     """
-    Fetch upcoming events from Google Calendar within the specified time frame.
+    Fetch a page of the events changed since `sync_token` was issued, or of every upcoming
+    event within the specified time frame without one.
     """
-    logger.info(f"Requesting events from Google Calendar for the next {DAYS_IN_FUTURE} days.")
-    now = datetime.datetime.utcnow()
-    time_min = now.strftime("%Y-%m-%dT%H:%M:%S") + "Z"
-    time_max = (now + datetime.timedelta(days=DAYS_IN_FUTURE)).strftime("%Y-%m-%dT%H:%M:%S") + "Z"
-
-    events_result = (
-        service.events()
-        .list(
+    if sync_token is not None:
+        # Time bounds can't be combined with a sync token
+        request = service.events().list(
+            calendarId=GOOGLE_CALENDAR_ID,
+            syncToken=sync_token,
+            pageToken=page_token,
+            maxResults=PAGE_SIZE,
+            singleEvents=True,
+        )
+    else:
+        now = datetime.datetime.utcnow()
+        time_min = now.strftime("%Y-%m-%dT%H:%M:%S") + "Z"
+        time_max = (now + datetime.timedelta(days=DAYS_IN_FUTURE)).strftime(
+            "%Y-%m-%dT%H:%M:%S"
+        ) + "Z"
+        # No ordering either, Google only issues sync tokens for unordered listings
+        request = service.events().list(
             calendarId=GOOGLE_CALENDAR_ID,
             timeMin=time_min,
             timeMax=time_max,
-            maxResults=100,
+            pageToken=page_token,
+            maxResults=PAGE_SIZE,
             singleEvents=True,
-            orderBy="startTime",
         )
-        .execute()
-    )
-    return events_result.get("items", [])
 
+    return request.execute()
 
-def get_discord_events():
+
+class EventListing:
     """
-    Fetch existing scheduled events from the Discord server.
+    Events of Google Calendar, streamed page after page as they are iterated over.
+
+    The token of the next incremental sync is only known once every page was read.
     """
-    logger.info("Requesting events from Discord.")
-    url = f"https://discord.com/api/v9/guilds/{DISCORD_GUILD_ID}/scheduled-events"
-    headers = {"Authorization": f"Bot {DISCORD_BOT_TOKEN}"}
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        logger.error(f"Failed to fetch Discord events: {response.content}")
-        return []
 
+    def __init__(self, google, sync_token=None):
+        self.google = google
+        self.sync_token = sync_token
+        self.next_sync_token = None
 
-def create_or_update_discord_event(event, discord_event_id=None):
-    """
-    Create a new scheduled event on Discord or update an existing one.
-    """
-    if discord_event_id is None:
-        # Creating a new event
-        url = f"https://discord.com/api/v9/guilds/{DISCORD_GUILD_ID}/scheduled-events"
-        method = requests.post
-    else:
-        # Updating an existing event
-        url = f"https://discord.com/api/v9/guilds/{DISCORD_GUILD_ID}/scheduled-events/{discord_event_id}"
-        method = requests.patch
+    async def __aiter__(self):
+        if self.sync_token is not None:
+            logger.info("Requesting event changes from Google Calendar.")
+        else:
+            logger.info(
+                f"Requesting events from Google Calendar for the next {DAYS_IN_FUTURE} days."
+            )
+
+        page_token = None
+        while True:
+            # The Google client is blocking, keep it off the event loop
+            events_result = await asyncio.to_thread(
+                self.google.call, get_upcoming_events, self.sync_token, page_token
+            )
+            for event in events_result.get("items", []):
+                yield event
+
+            page_token = events_result.get("nextPageToken")
+            if page_token is None:
+                self.next_sync_token = events_result.get("nextSyncToken")
+                return
 
-    headers = {"Authorization": f"Bot {DISCORD_BOT_TOKEN}", "Content-Type": "application/json"}
 
-    # Get start and end times, handling all-day events
+def event_times(event):
+    """
+    Start and end of a Google Calendar event, all-day events spanning whole days.
+    """
     start_time = event["start"].get("dateTime", event["start"].get("date"))
     end_time = event["end"].get("dateTime", event["end"].get("date"))
 
@@ -90,49 +167,110 @@ def create_or_update_discord_event(event, discord_event_id=None):
         start_time += "T00:00:00Z"
         end_time += "T23:59:59Z"
 
+    return datetime.datetime.fromisoformat(start_time), datetime.datetime.fromisoformat(end_time)
+
+
+def in_time_frame(event):
+    """
+    Whether a Google Calendar event is still scheduled, not over yet and starting within
+    the synchronized time frame.
+    """
+    if event.get("status") == "cancelled":
+        return False
+    start_time, end_time = event_times(event)
+    now = datetime.datetime.now(datetime.UTC)
+    return end_time > now and start_time <= now + datetime.timedelta(days=DAYS_IN_FUTURE)
+
+
+def has_started(event):
+    """
+    Whether a Google Calendar event has started, Discord events can't be created or
+    moved anymore then.
+    """
+    start_time, _ = event_times(event)
+    return start_time <= datetime.datetime.now(datetime.UTC)
+
+
+def event_hash(event):
+    """
+    Hash of the content of a Google Calendar event sent to Discord.
+    """
+    content = [
+        event["summary"],
+        event.get("description", ""),
+        event["start"],
+        event["end"],
+        DISCORD_CHANNEL_ID,
+    ]
+    return hashlib.blake2b(json.dumps(content).encode(), digest_size=8).hexdigest()
+
+
+async def create_or_update_discord_event(guild, event, discord_event=None):
+    """
+    Create a new scheduled event on Discord or update an existing one.
+    """
+    start_time, end_time = event_times(event)
     data = {
         "name": event["summary"],
         "description": event.get("description", ""),
-        "scheduled_start_time": start_time,
-        "scheduled_end_time": end_time,
-        "privacy_level": 2,
-        "entity_type": 2,
-        "channel_id": DISCORD_CHANNEL_ID,
+        "start_time": start_time,
+        "end_time": end_time,
+        "privacy_level": PrivacyLevel.guild_only,
+        "entity_type": EntityType.voice,
+        "channel": Object(DISCORD_CHANNEL_ID),
     }
 
-    response = method(url, json=data, headers=headers)
-    time.sleep(1)  # Pause to respect rate limits
-    if response.status_code in (200, 201):
-        action = "updated" if discord_event_id else "created"
-        logger.info(f"Event {event['summary']} {action} on Discord")
-        return response.json().get("id")
-    else:
-        action = "update" if discord_event_id else "create"
-        logger.error(f"Failed to {action} event {event['summary']} on Discord: {response.content}")
+    # Rate limits are handled by the bot's HTTP client, from the X-RateLimit headers
+    updating = discord_event is not None
+    try:
+        if updating:
+            discord_event = await discord_event.edit(**data)
+        else:
+            discord_event = await guild.create_scheduled_event(**data)
+    except HTTPException as e:
+        action = "update" if updating else "create"
+        logger.error(f"Failed to {action} event {event['summary']} on Discord: {e}")
         return None
 
+    action = "updated" if updating else "created"
+    logger.info(f"Event {event['summary']} {action} on Discord")
+    return str(discord_event.id)
+
 
-def delete_discord_event(event_id):
+async def delete_discord_event(discord_event):
     """
-    Delete a scheduled event from Discord using its event ID.
+    Delete a scheduled event from Discord.
     """
-    url = f"https://discord.com/api/v9/guilds/{DISCORD_GUILD_ID}/scheduled-events/{event_id}"
-    headers = {"Authorization": f"Bot {DISCORD_BOT_TOKEN}"}
-    response = requests.delete(url, headers=headers)
-    time.sleep(2)  # Pause to respect rate limits
-    if response.status_code == 204:
-        logger.info(f"Event {event_id} deleted from Discord")
+    try:
+        await discord_event.delete()
+    except HTTPException as e:
+        logger.error(f"Failed to delete event {discord_event.id} from Discord: {e}")
     else:
-        logger.error(f"Failed to delete event {event_id} from Discord: {response.content}")
+        logger.info(f"Event {discord_event.id} deleted from Discord")
 
 
 class Calendar(commands.Cog, name="calendar"):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.synced_events = ConfigManager.get("synced_events", {"events": []})
+        # Synced events indexed by Google Calendar event ID and by Discord event ID
+        events = self.synced_events["events"]
+        self.by_google = {event["google_event_id"]: event for event in events}
+        self.by_discord = {event["discord_event_id"]: event for event in events}
+        self.google = CalendarService()
+        # Limit of Discord events created, updated or deleted at the same time
+        self.semaphore = asyncio.Semaphore(SYNC_CONCURRENCY)
 
-        # Start the periodic synchronization loop
-        #self.sync_events_loop.start()
+    async def cog_load(self):
+        # Start the periodic synchronization loop, unless there is no calendar to read
+        if GOOGLE_CREDENTIALS_JSON:
+            self.sync_events_loop.start()
+        else:
+            logger.warning("GOOGLE_CREDENTIALS_JSON is not set, calendar sync disabled")
+
+    async def cog_unload(self):
+        self.sync_events_loop.cancel()
+        self.google.session.close()
 
     @tasks.loop(seconds=SYNC_INTERVAL)
     async def sync_events_loop(self):
@@ -140,71 +278,176 @@ class Calendar(commands.Cog, name="calendar"):
         Periodically synchronize events from Google Calendar to Discord.
         """
         try:
-            service = get_google_calendar_service()
-            events = get_upcoming_events(service)
-            discord_events = get_discord_events()
-
-            # Create a set of current Discord event IDs for quick lookup
-            discord_event_ids = {event["id"] for event in discord_events}
-
-            for event in events:
-                event_id = event["id"]
-                event_data = {
-                    "date": event["start"].get("dateTime", event["start"].get("date")),
-                    "title": event["summary"],
-                    "channel": DISCORD_CHANNEL_ID,
-                    "notes": event.get("description", ""),
-                }
-
-                # Check if the event has already been synchronized
-                if any(e["google_event_id"] == event_id for e in self.synced_events["events"]):
-                    for synced_event in self.synced_events["events"]:
-                        if synced_event["google_event_id"] == event_id:
-                            discord_event_id = synced_event["discord_event_id"]
-                            if discord_event_id not in discord_event_ids:
-                                # The event is missing on Discord, recreate it
-                                logger.info(
-                                    f"Event {event['summary']} is missing on Discord, recreating"
-                                )
-                                discord_event_id = create_or_update_discord_event(event)
-                                if discord_event_id:
-                                    synced_event["discord_event_id"] = discord_event_id
-                                    synced_event.update(event_data)
-                                    ConfigManager.set("synced_events", self.synced_events)
-                            else:
-                                # Update the existing Discord event
-                                discord_event_id = create_or_update_discord_event(
-                                    event, discord_event_id
-                                )
-                                if discord_event_id:
-                                    synced_event.update(event_data)
-                                    ConfigManager.set("synced_events", self.synced_events)
-                            break
+            guild = self.bot.get_guild(DISCORD_GUILD_ID)
+            if guild is None:
+                logger.error(f"Guild {DISCORD_GUILD_ID} not found, events not synchronized")
+                return
+
+            # Only the changes since the last cycle are fetched, with a full sync from time
+            # to time so the events entering the time frame are picked up
+            sync = ConfigManager.get("calendar_sync", {})
+            sync_token = sync.get("token")
+            if time.time() - sync.get("full_sync", 0) > FULL_SYNC_INTERVAL:
+                sync_token = None
+
+            # Scheduled events of the guild, kept up to date by the gateway
+            discord_events = {str(event.id): event for event in guild.scheduled_events}
+
+            # Changes which failed to reach Discord in the previous cycles, with their attempts,
+            # a full sync lists the events still there anyway
+            pending = {item["event"]["id"]: item for item in sync.get("pending", [])}
+            retries = [item["event"] for item in pending.values()] if sync_token else []
+
+            start = time.perf_counter()
+            listing = EventListing(self.google, sync_token)
+            try:
+                creates, updates, deletes, listed = await self.plan(
+                    listing, discord_events, retries
+                )
+            except HttpError as e:
+                if e.resp.status != 410 or sync_token is None:
+                    raise
+                logger.info("Google Calendar sync token expired, running a full sync")
+                sync_token = None
+                listing = EventListing(self.google)
+                creates, updates, deletes, listed = await self.plan(listing, discord_events)
+            logger.debug(
+                f"Google Calendar listed in {(time.perf_counter() - start) * 1000:.0f} ms, "
+                f"{self.google.overhead * 1000:.0f} ms of it setting up the service"
+            )
+
+            orphans = []
+            if sync_token is None:
+                # A full sync lists every event left, the others were removed, and events
+                # created by the bot but not recorded are leftovers
+                for google_event_id, synced_event in self.by_google.items():
+                    if google_event_id not in listed:
+                        deletes[google_event_id] = synced_event
+                orphans = [
+                    event
+                    for discord_event_id, event in discord_events.items()
+                    if event.creator_id == self.bot.user.id
+                    and event.channel_id == DISCORD_CHANNEL_ID
+                    and discord_event_id not in self.by_discord
+                ]
+
+            failed = await self.apply(guild, discord_events, creates, updates, deletes, orphans)
+
+            # Failed changes are tried again in the next cycles, without holding back the
+            # sync token and the other changes
+            sync["pending"] = []
+            for event in failed:
+                attempts = pending.get(event["id"], {}).get("attempts", 0) + 1
+                if attempts < MAX_ATTEMPTS:
+                    sync["pending"].append({"event": event, "attempts": attempts})
                 else:
-                    # The event is new, create it on Discord
-                    discord_event_id = create_or_update_discord_event(event)
-                    if discord_event_id:
-                        self.synced_events["events"].append(
-                            {
-                                "google_event_id": event_id,
-                                "discord_event_id": discord_event_id,
-                                **event_data,
-                            }
-                        )
-                        ConfigManager.set("synced_events", self.synced_events)
-
-            # Remove events from Discord that no longer exist in Google Calendar
-            google_event_ids = {event["id"] for event in events}
-            for synced_event in list(self.synced_events["events"]):
-                time.sleep(2)  # Pause to respect rate limits
-                if synced_event["google_event_id"] not in google_event_ids:
-                    delete_discord_event(synced_event["discord_event_id"])
-                    self.synced_events["events"].remove(synced_event)
-                    ConfigManager.set("synced_events", self.synced_events)
+                    logger.error(f"Giving up on syncing event {event['summary']} to Discord")
+            if sync_token is None:
+                sync["full_sync"] = time.time()
+            sync["token"] = listing.next_sync_token
+            ConfigManager.set("calendar_sync", sync)
 
         except Exception as e:
             logger.error(f"Error in sync_events_loop: {e}")
 
+    @sync_events_loop.before_loop
+    async def before_sync_events_loop(self):
+        await self.bot.wait_until_ready()
+
+    async def plan(self, listing, discord_events, pending=()):
+        """
+        Compare the listed Google Calendar events, then the `pending` ones not listed
+        again, with the synced ones in a single pass. Return the events to create and
+        update on Discord, the synced events to delete by Google event ID, and the IDs of
+        the events listed within the time frame.
+        """
+        creates = []
+        updates = []
+        deletes = {}
+        listed = set()
+
+        def compare(event):
+            synced_event = self.by_google.get(event["id"])
+            if not in_time_frame(event):
+                # Cancelled, over, or moved after the time frame
+                if synced_event is not None:
+                    deletes[event["id"]] = synced_event
+                return
+
+            listed.add(event["id"])
+            if has_started(event):
+                # Left as it is on Discord until it is over
+                return
+            if synced_event is None:
+                # The event is new, create it on Discord
+                creates.append(event)
+            elif synced_event["discord_event_id"] not in discord_events:
+                # The event is missing on Discord, recreate it
+                logger.info(f"Event {event['summary']} is missing on Discord, recreating")
+                creates.append(event)
+            elif synced_event.get("content_hash") != event_hash(event):
+                # Update the existing Discord event
+                updates.append((event, discord_events[synced_event["discord_event_id"]]))
+
+        seen = set()
+        async for event in listing:
+            seen.add(event["id"])
+            compare(event)
+        for event in pending:
+            if event["id"] not in seen:
+                compare(event)
+        return creates, updates, deletes, listed
+
+    async def apply(self, guild, discord_events, creates, updates, deletes, orphans):
+        """
+        Carry out a synchronization plan on Discord, then save the synced events at once,
+        returning the Google Calendar events which failed to be created or updated.
+        `orphans` are Discord events to delete which are not synced to any Google
+        Calendar event.
+        """
+
+        async def sync(event, discord_event=None):
+            async with self.semaphore:
+                discord_event_id = await create_or_update_discord_event(guild, event, discord_event)
+            if discord_event_id is None:
+                return event
+            self.by_google[event["id"]] = {
+                "google_event_id": event["id"],
+                "discord_event_id": discord_event_id,
+                "date": event["start"].get("dateTime", event["start"].get("date")),
+                "title": event["summary"],
+                "channel": DISCORD_CHANNEL_ID,
+                "notes": event.get("description", ""),
+                "content_hash": event_hash(event),
+            }
+
+        async def delete(discord_event):
+            async with self.semaphore:
+                await delete_discord_event(discord_event)
+
+        if not (creates or updates or deletes or orphans):
+            return []
+
+        # Events already gone from Discord only need to be forgotten
+        for google_event_id in deletes:
+            self.by_google.pop(google_event_id)
+        removed = [
+            discord_events[synced_event["discord_event_id"]]
+            for synced_event in deletes.values()
+            if synced_event["discord_event_id"] in discord_events
+        ]
+
+        failed = await asyncio.gather(
+            *[sync(event) for event in creates],
+            *[sync(event, discord_event) for event, discord_event in updates],
+        )
+        await asyncio.gather(*[delete(discord_event) for discord_event in removed + orphans])
+
+        self.synced_events["events"] = list(self.by_google.values())
+        self.by_discord = {event["discord_event_id"]: event for event in self.by_google.values()}
+        ConfigManager.set("synced_events", self.synced_events)
+        return [event for event in failed if event is not None]
+
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(Calendar(bot))
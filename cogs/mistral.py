@@ -1,6 +1,7 @@
 import contextlib
 import os
 import re
+import time
 from collections import defaultdict
 
 from discord import Message, NotFound
@@ -8,20 +9,90 @@ from discord.ext import commands
 from loguru import logger
 from mistralai import Mistral as MistralChat
 
+# Longest message content Discord accepts
+MESSAGE_LENGTH = 2000
+# Delay (in seconds) between two edits of a streamed answer, within Discord's rate limits
+EDIT_INTERVAL = 1.0
 
-def divide_msg(content):
+FENCE = re.compile(r"^```(\S*)", re.MULTILINE)
+MENTION = re.compile(r"<@&?\d+>")
+
+
+def open_fence(content):
+    """Language of the code block left open at the end of `content`, None if all are closed."""
+    language = None
+    for match in FENCE.finditer(content):
+        language = match.group(1) if language is None else None
+    return language
+
+
+def split_message(content, limit=MESSAGE_LENGTH):
+    """
+    Split `content` into messages of at most `limit` characters, on line breaks or spaces
+    when possible. A code block cut in two is closed at the end of a message and opened
+    again, in the same language, at the start of the next one.
+    """
     parts = []
-    while len(content) > 2000:
-        split_index = content.rfind(".", 0, 2000)
-        if split_index == -1:
-            split_index = content.rfind(" ", 0, 2000)
-        if split_index == -1:
-            split_index = 2000
-        parts.append(content[: split_index + 1])
-        content = content[split_index + 1 :]
-    parts.append(content)
+    while True:
+        if len(content) <= limit:
+            parts.append(content)
+            return parts
+
+        # Room is kept to close a code block
+        end = limit - len("\n```")
+        split = content.rfind("\n", 0, end)
+        if split < end // 2:
+            split = content.rfind(" ", 0, end)
+        if split < end // 2:
+            split = end
+
+        part = content[:split]
+        # The line break or space the message is split on is dropped
+        rest = content[split + 1 :] if content[split].isspace() else content[split:]
+        language = open_fence(part)
+        if language is not None:
+            part += "\n```"
+            rest = f"```{language}\n{rest}"
+        parts.append(part)
+        content = rest
+
 
-    return parts
+class StreamedReply:
+    """
+    Reply to a message, edited as the answer is streamed.
+
+    The first part is posted as soon as there is something to show, then the messages are
+    edited every `EDIT_INTERVAL` seconds at most, new ones being posted as the answer
+    grows past the length of a message.
+    """
+
+    def __init__(self, message: Message):
+        self.message = message
+        self.content = ""
+        # Posted messages, and the content last sent to each
+        self.replies = []
+        self.sent = []
+        self.last_edit = 0
+
+    async def append(self, text):
+        self.content += text
+        if not self.replies or time.monotonic() - self.last_edit >= EDIT_INTERVAL:
+            await self.flush()
+
+    async def flush(self):
+        parts = split_message(MENTION.sub("X", self.content).strip())
+        if not parts[-1].strip():
+            return
+
+        self.last_edit = time.monotonic()
+        for i, part in enumerate(parts):
+            if i < len(self.replies):
+                if self.sent[i] != part:
+                    await self.replies[i].edit(content=part)
+                    self.sent[i] = part
+            else:
+                self.replies.append(await self.message.reply(part))
+                self.sent.append(part)
 
 
 class Mistral(commands.Cog, name="mistral"):
@@ -70,17 +141,28 @@ class Mistral(commands.Cog, name="mistral"):
                     async with MistralChat(
                         api_key=os.getenv("MISTRAL_API_KEY", ""),
                     ) as mistral:
-                        answer = await mistral.chat.complete_async(
+                        start = time.perf_counter()
+                        first_token = None
+                        reply = StreamedReply(message)
+                        stream = await mistral.chat.stream_async(
                             model="codestral-latest",
                             messages=conversation,
-                            stream=False,
                         )
-                        answer = re.sub(
-                            r"<@&?\d+>", "X", answer.choices[0].message.content
+                        async for event in stream:
+                            text = event.data.choices[0].delta.content
+                            if not isinstance(text, str) or not text:
+                                continue
+                            if first_token is None:
+                                first_token = time.perf_counter() - start
+                                logger.info(f"Mistral first token after {first_token:.2f} s")
+                            await reply.append(text)
+                        await reply.flush()
+                        logger.info(
+                            f"Mistral answered {len(reply.content)} characters "
+                            f"in {time.perf_counter() - start:.2f} s"
                         )
+                    answer = MENTION.sub("X", reply.content)
                     conversation.append({"role": "assistant", "content": answer})
-                    for part in divide_msg(answer):
-                        await message.reply(part)
                 except Exception as e:
                     await message.reply(str(e))
                     raise e
@@ -1,131 +1,689 @@
-import re
-from datetime import datetime
+import asyncio
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlparse
 
-import feedparser
-from discord import Colour, Embed
-from discord.ext import commands, tasks
+import aiohttp
+from discord import Colour, Embed, HTTPException, Interaction, TextChannel, app_commands
+from discord.ext import commands
+from loguru import logger
 
-from config import NEWS_CHANNEL, ConfigManager
+from config import (
+    MAIN_COLOR,
+    NEWS_CHANNEL,
+    NEWS_CONCURRENCY,
+    NEWS_DIGEST_INTERVAL,
+    NEWS_DUPLICATE_THRESHOLD,
+    NEWS_DUPLICATE_WINDOW,
+    NEWS_FETCH_TIMEOUT,
+    NEWS_MAX_INTERVAL,
+    NEWS_MIN_INTERVAL,
+    NEWS_PARSE_WORKERS,
+    NEWS_REQUEST_BUDGET,
+    NEWS_RETENTION_COUNT,
+    NEWS_RETENTION_DAYS,
+    ConfigManager,
+)
+from ui.paginator import Paginator
+from utils.archive import Archive
+from utils.autocomplete import AutocompleteIndex
+from utils.dedupe import SentEntries
+from utils.feeds import parse_feed
+from utils.render import (
+    EMBED_DESCRIPTION,
+    EMBED_TITLE,
+    FIELD_NAME,
+    FIELD_VALUE,
+    fits,
+    paginate,
+    render,
+)
+from utils.scheduler import TimerHeap, TokenBucket
+from utils.similarity import NearDuplicateIndex
+
+# Polls expected between two entries of a feed, given its publication cadence
+POLLS_PER_ENTRY = 4
+# Longest a silent feed stretches its expected gap between entries, in learned cadences
+MAX_SLOWDOWN = 2
+# Weight of the latest gap between entries in the learned cadence
+CADENCE_SMOOTHING = 0.3
+# Relative random spread of the poll delays, so feeds don't end up polled in lockstep
+JITTER = 0.1
+# Delay (in seconds) during which new entries are gathered into the same messages
+DELIVERY_DELAY = 2
+# Results shown per page of /archive search
+SEARCH_PAGE_SIZE = 5
+# Largest feed document downloaded, in bytes
+MAX_FEED_SIZE = 5 * 1024 * 1024
+
+# Feeds registered the first time the cog is loaded
+DEFAULT_FEEDS = [
+    {"url": "https://www.cert.ssi.gouv.fr/feed/", "name": "CERT-FR", "color": 0xE74C3C},
+    {"url": "https://www.zataz.com/feed/", "name": "ZATAZ", "color": 0x3498DB},
+    {"url": "https://www.clusif.fr/feed", "name": "CLUSIF", "color": 0x2ECC71},
+]
+
+
+async def is_owner(interaction: Interaction):
+    """App command check, `commands.is_owner` only applies to prefix commands."""
+    return await interaction.client.is_owner(interaction.user)
 
 
 class News(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.channel_id = NEWS_CHANNEL.id
-        self.sent_entries = ConfigManager.get("feeds", [])
-        self.feeds = [
-            ("https://www.cert.ssi.gouv.fr/feed/", "CERT-FR"),
-            ("https://www.zataz.com/feed/", "ZATAZ"),
-            ("https://www.clusif.fr/feed", "CLUSIF"),
-        ]
+        # Entries already posted, forgotten after the retention period
+        self.sent_entries = SentEntries(NEWS_RETENTION_DAYS * 24 * 3600, NEWS_RETENTION_COUNT)
+        self.sent_entries.load()
+        # HTTP cache validators and newest publication time seen, keyed by feed URL
+        self.feed_state = ConfigManager.get("feed_state", {})
+        # Registered feeds, keyed by URL
+        feeds = ConfigManager.get("news_feeds", [])
+        # An empty feed table reads as no value, a flag tells it apart from a first start
+        # so the default feeds are not registered again once every feed was removed
+        if not ConfigManager.get("news_feeds_seeded"):
+            if not feeds:
+                feeds = [
+                    {"channel": None, "min_interval": None, "max_interval": None, **feed}
+                    for feed in DEFAULT_FEEDS
+                ]
+                ConfigManager.set("news_feeds", feeds)
+            ConfigManager.set("news_feeds_seeded", True)
+        self.feeds = {feed["url"]: feed for feed in feeds}
+        self.feed_index = AutocompleteIndex(self.feeds)
+        self.source_index = AutocompleteIndex(feed["name"] for feed in feeds)
 
-        # Start the news update task
-        self.news_update.start()
+        # Searchable archive of every entry seen
+        self.archive = Archive()
 
-    def clean_html(self, raw_html):
-        """Remove HTML tags from a string."""
-        cleanr = re.compile("<.*?>")
-        cleantext = re.sub(cleanr, "", raw_html)
-        return cleantext.strip()
+        # Limit of feeds downloaded at the same time
+        self.semaphore = asyncio.Semaphore(NEWS_CONCURRENCY)
+        # Worker processes parsing the feeds, the GIL would stall the bot in a thread
+        self.parser = None
 
-    def format_date(self, date_str):
-        """Format the publication date nicely."""
-        try:
-            date = datetime.strptime(date_str, "%a, %d %b %Y %H:%M:%S %z")
-            return date.strftime("%d/%m/%Y à %H:%M")
-        except Exception:
-            return date_str
+        # Next poll of every feed, and polls in progress keyed by feed URL
+        self.scheduler = TimerHeap(self.start_poll)
+        self.polls = {}
+        self.budget = TokenBucket(NEWS_REQUEST_BUDGET / 3600, NEWS_REQUEST_BUDGET / 4)
+
+        # Entries waiting to be posted, and the tasks posting them, keyed by channel ID
+        self.outbox = {}
+        self.deliveries = {}
+        # Posts to edit with sources added to their story, by channel ID then message ID
+        self.edits = {}
+        # Stories posted lately, to recognize them when other feeds report them
+        self.stories = NearDuplicateIndex(NEWS_DUPLICATE_THRESHOLD, NEWS_DUPLICATE_WINDOW * 3600)
+
+    async def cog_load(self):
+        self.parser = ProcessPoolExecutor(
+            NEWS_PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+
+        # Posted entries used to be a list in the configuration, without their feed
+        legacy = ConfigManager.get("feeds")
+        if legacy is not None:
+            await self.sent_entries.add("", legacy)
+            ConfigManager.remove("feeds")
 
-    def get_source(self, feed_url):
-        """Get source name from feed URL."""
-        for url, name in self.feeds:
-            if feed_url.startswith(url):
-                return name
+        now = time.time()
+        for feed_url in self.feeds:
+            # Feeds due at startup are spread over a minute rather than polled at once
+            next_poll = self.feed_state.get(feed_url, {}).get("next_poll", 0)
+            self.scheduler.schedule(feed_url, max(next_poll, now + random.uniform(0, 60)))
+        self.scheduler.start()
 
-    def get_category_color(self, source):
-        """Return color based on source."""
-        colors = {"CERT-FR": Colour.red(), "ZATAZ": Colour.blue(), "CLUSIF": Colour.green()}
-        return colors.get(source, Colour.default())
+    async def cog_unload(self):
+        self.scheduler.stop()
+        for task in self.polls.values():
+            task.cancel()
+        self.parser.shutdown(wait=False, cancel_futures=True)
 
-    def create_embed(self, entry, feed_url):
-        """Create a rich embed for the news entry."""
-        source = self.get_source(feed_url)
+        # Entries already marked as posted would be lost otherwise
+        for task in self.deliveries.values():
+            task.cancel()
+        for channel_id in self.outbox.keys() | self.edits.keys():
+            try:
+                await self.send_outbox(channel_id)
+            except Exception:
+                logger.exception(f"Failed to post the news in {channel_id}")
 
-        # Clean and truncate description
-        description = self.clean_html(entry.get("description", ""))
+    async def cog_app_command_error(self, interaction: Interaction, error):
+        if isinstance(error, app_commands.CheckFailure):
+            await interaction.response.send_message(
+                "Commande réservée au propriétaire du bot.", ephemeral=True
+            )
+
+    async def fetch_feed(self, feed_url):
+        """
+        Download and parse a feed, returning its entries and HTTP cache validators, or
+        None if it did not change since the last poll.
+        """
+        state = self.feed_state.get(feed_url, {})
+        headers = {}
+        if state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        if state.get("modified"):
+            headers["If-Modified-Since"] = state["modified"]
+
+        # Failed polls are retried by the scheduler, with a backoff of its own
+        async with self.semaphore:
+            response = await self.bot.http_client.get(
+                feed_url,
+                headers=headers,
+                timeout=NEWS_FETCH_TIMEOUT,
+                retries=0,
+                max_size=MAX_FEED_SIZE,
+            )
+        if response.status == 304:
+            return None
+
+        # Parsing and cleaning are CPU bound, they run in a worker process which only
+        # sends back slim entry records
+        entries = await asyncio.get_running_loop().run_in_executor(
+            self.parser, parse_feed, response.body, dict(response.headers)
+        )
+
+        validators = {
+            "etag": response.headers.get("ETag"),
+            "modified": response.headers.get("Last-Modified"),
+        }
+        return entries, validators
+
+    def create_embed(self, entry, feed, also=()):
+        """Create a rich embed for the news entry, `also` listing other sources of it."""
+        source = feed["name"]
+
+        # Truncate description
+        description = entry["text"]
         if len(description) > 1000:
             description = description[:997] + "..."
 
         # Create embed
         embed = Embed(
-            title=entry.get("title", "Sans titre"),
-            url=entry.get("link", ""),
+            title=entry["title"] or "Sans titre",
+            url=entry["link"],
             description=description,
-            color=self.get_category_color(source),
+            color=Colour(feed["color"]),
         )
 
         # Add metadata fields
         embed.add_field(name="Source", value=f":shield: {source}", inline=True)
 
-        if "pubDate" in entry:
+        if entry["published"]:
             embed.add_field(
                 name="Date de publication",
-                value=f":calendar: {self.format_date(entry.pubDate)}",
+                value=f":calendar: <t:{entry['published']}:f>",
                 inline=True,
             )
 
-        if "author" in entry:
+        if entry["author"]:
+            embed.add_field(name="Auteur", value=f":pencil: {entry['author']}", inline=True)
+
+        if entry["categories"]:
             embed.add_field(
-                name="Auteur", value=f":pencil: {entry.get('author', 'Non spécifié')}", inline=True
+                name="Catégories",
+                value=f":label: {', '.join(entry['categories'])}"[:FIELD_VALUE],
+                inline=False,
             )
 
-        if "category" in entry:
-            categories = entry.get("category", [])
-            if not isinstance(categories, list):
-                categories = [categories]
-            if categories:
-                embed.add_field(
-                    name="Catégories", value=f":label: {', '.join(categories)}", inline=False
-                )
+        if also:
+            sources = ", ".join(f"[{name}]({link})" if link else name for name, link in also)
+            embed.add_field(
+                name="Également rapporté par",
+                value=f":link: {sources}"[:FIELD_VALUE],
+                inline=False,
+            )
 
         # Add footer with entry ID for tracking
-        embed.set_footer(text=f"ID: {entry.get('id', 'Unknown')}")
+        embed.set_footer(text=f"ID: {entry['id']}")
 
         return embed
 
+    def create_digest(self, feed, stories):
+        """Create a single embed listing the titles of several entries of a feed."""
+        lines = []
+        for story in stories:
+            entry = story["entry"]
+            line = f"- [{entry['title'] or 'Sans titre'}]({entry['link']})"
+            if story["also"]:
+                line += f" (aussi : {', '.join(name for name, _ in story['also'])})"
+            lines.append(line)
+        description = ""
+        for i, line in enumerate(lines):
+            # Room is left for the count of the entries not listed
+            if len(description) + len(line) > EMBED_DESCRIPTION - 50:
+                description += f"… et {len(lines) - i} autres"
+                break
+            description += f"{line}\n"
+
+        return Embed(
+            title=f"{feed['name']} - {len(stories)} nouvelles publications",
+            description=description.strip(),
+            color=Colour(feed["color"]),
+        )
+
+    def render_stories(self, stories):
+        """Build the embeds showing `stories`, each with the stories it shows."""
+        if NEWS_DIGEST_INTERVAL:
+            by_feed = {}
+            for story in stories:
+                by_feed.setdefault(story["feed"]["url"], []).append(story)
+            return [
+                (self.create_digest(group[0]["feed"], group), group) for group in by_feed.values()
+            ]
+        return [
+            (self.create_embed(story["entry"], story["feed"], story["also"]), [story])
+            for story in stories
+        ]
+
+    def deliver(self, feed, entries):
+        """
+        Queue new entries of `feed` for its channel. Entries queued together are sent
+        as few messages as possible, or as a digest in digest mode.
+
+        An entry telling the same story as a recent entry of another feed is not posted,
+        its source is added to the post of the first one instead.
+        """
+        for entry in entries:
+            # Signatures are computed by the parsing workers
+            signature = entry["signature"]
+            original = None
+            if signature is not None:
+                original = self.stories.find(
+                    signature, where=lambda story: story["feed"]["url"] != feed["url"]
+                )
+
+            if original is not None:
+                original["also"].append((feed["name"], entry["link"]))
+                record = original["message"]
+                if record is not None:
+                    # Already posted, the message is edited with the next delivery
+                    self.edits.setdefault(record["channel_id"], {})[record["message_id"]] = record
+                    self.schedule_delivery(record["channel_id"])
+                continue
+
+            story = {"feed": feed, "entry": entry, "also": [], "message": None}
+            if signature is not None:
+                self.stories.add(signature, story)
+            channel_id = feed["channel"] or self.channel_id
+            self.outbox.setdefault(channel_id, []).append(story)
+            self.schedule_delivery(channel_id)
+
+    def schedule_delivery(self, channel_id):
+        if channel_id not in self.deliveries:
+            self.deliveries[channel_id] = asyncio.create_task(self.flush_outbox(channel_id))
+
+    async def flush_outbox(self, channel_id):
+        try:
+            await asyncio.sleep(NEWS_DIGEST_INTERVAL or DELIVERY_DELAY)
+            await self.send_outbox(channel_id)
+        except Exception:
+            logger.exception(f"Failed to post the news in {channel_id}")
+        finally:
+            del self.deliveries[channel_id]
+            # Entries queued while the messages were being sent
+            if channel_id in self.outbox or channel_id in self.edits:
+                self.schedule_delivery(channel_id)
+
+    async def send_outbox(self, channel_id):
+        stories = self.outbox.pop(channel_id, [])
+        edits = self.edits.pop(channel_id, {})
+        channel = self.bot.get_channel(channel_id)
+        if channel is None:
+            return
+
+        # Posts of stories reported by other sources since
+        for record in edits.values():
+            embeds = [embed for embed, _ in self.render_stories(record["stories"])]
+            if not fits(embeds):
+                continue
+            try:
+                await channel.get_partial_message(record["message_id"]).edit(embeds=embeds)
+            except HTTPException as e:
+                logger.warning(f"Failed to edit the news message {record['message_id']}: {e}")
+
+        # Up to 10 embeds and 6000 characters per message
+        rendered = self.render_stories(stories)
+        start = 0
+        for page in paginate([embed for embed, _ in rendered]):
+            group = [story for _, shown in rendered[start : start + len(page)] for story in shown]
+            start += len(page)
+            message = await channel.send(embeds=page)
+            record = {"channel_id": channel_id, "message_id": message.id, "stories": group}
+            for story in group:
+                story["message"] = record
+
     @commands.hybrid_command(
         name="news",
         description="Get the latest news from various sources.",
     )
     async def news_command(self, context: commands.Context):
-        await self.news_update()
+        await context.defer(ephemeral=True)
+        # Feeds already being polled are waited for rather than polled twice
+        polls = [await self.start_poll(feed_url) for feed_url in self.feeds]
+        await asyncio.gather(*polls, return_exceptions=True)
+        await context.send("Flux d'actualités mis à jour.", ephemeral=True)
+
+    async def source_autocomplete(
+        self, _: Interaction, current: str
+    ) -> list[app_commands.Choice[str]]:
+        return self.source_index.choices(current)
+
+    @commands.hybrid_group(name="archive", description="Actualités archivées.")
+    async def archive_command(self, context: commands.Context):
+        pass
+
+    @archive_command.command(name="search", description="Rechercher dans les actualités archivées.")
+    @app_commands.describe(
+        query="Mots à rechercher.",
+        source="Limiter la recherche à une source.",
+        since="Limiter la recherche aux N derniers jours.",
+    )
+    @app_commands.autocomplete(source=source_autocomplete)
+    async def news_search(
+        self,
+        context: commands.Context,
+        query: str,
+        source: str = None,
+        since: commands.Range[int, 1] = None,
+    ):
+        await context.defer(ephemeral=True)
+        start = int(time.time()) - since * 24 * 3600 if since else None
+
+        async def render_page(page):
+            total, articles = await self.archive.search(
+                query, source, start, SEARCH_PAGE_SIZE, page * SEARCH_PAGE_SIZE
+            )
+            embed = Embed(
+                title=f"Recherche : {query}"[:EMBED_TITLE],
+                description=f"{total} résultat{'s' if total > 1 else ''}",
+                color=MAIN_COLOR,
+            )
+            for article in articles:
+                value = f"{article.source} - <t:{article.published}:d>\n{article.snippet}"
+                embed.add_field(
+                    name=article.title[:FIELD_NAME] or "Sans titre",
+                    value=f"{value[: FIELD_VALUE - len(article.link) - 1]}\n{article.link}",
+                    inline=False,
+                )
+            pages = max(1, -(-total // SEARCH_PAGE_SIZE))
+            embed.set_footer(text=f"Page {page + 1}/{pages}")
+            return embed, pages
+
+        embed, pages = await render_page(0)
+        if pages == 1:
+            await context.send(embed=embed, ephemeral=True)
+            return
+
+        async def render(page):
+            return (await render_page(page))[0]
+
+        await context.send(embed=embed, view=Paginator(render, pages), ephemeral=True)
+
+    async def start_poll(self, feed_url, _=None):
+        """Start polling a feed in the background, unless it is already being polled."""
+        if feed_url not in self.polls:
+            self.scheduler.cancel(feed_url)
+            self.polls[feed_url] = asyncio.create_task(self.poll(feed_url))
+        return self.polls[feed_url]
+
+    async def poll(self, feed_url):
+        """Poll a feed, post its new entries and schedule its next poll."""
+        state = self.feed_state.setdefault(feed_url, {})
+        try:
+            await self.bot.wait_until_ready()
+            # Over budget, the poll is postponed until a request is available
+            delay = self.budget.take() or await self.update_feed(feed_url, state)
+        except Exception:
+            logger.exception(f"Failed to update the feed {feed_url}")
+            delay = self.backoff(feed_url, state)
+        finally:
+            del self.polls[feed_url]
+
+        if feed_url not in self.feeds:
+            # Removed while it was being polled
+            return
+
+        state["next_poll"] = time.time() + delay * random.uniform(1 - JITTER, 1 + JITTER)
+        ConfigManager.set("feed_state", self.feed_state)
+        self.scheduler.schedule(feed_url, state["next_poll"])
+
+    async def update_feed(self, feed_url, state):
+        """Fetch a feed and post its new entries, returning the delay until the next poll."""
+        try:
+            fetched = await self.fetch_feed(feed_url)
+        except aiohttp.ClientResponseError as e:
+            logger.warning(f"Failed to fetch the feed {feed_url}: {e.status} {e.message}")
+            retry_after = e.headers.get("Retry-After", "") if e.headers else ""
+            if e.status in (429, 503) and retry_after.isdigit():
+                return max(self.backoff(feed_url, state), int(retry_after))
+            return self.backoff(feed_url, state)
+        except (aiohttp.ClientError, TimeoutError) as e:
+            logger.warning(f"Failed to fetch the feed {feed_url}: {e!r}")
+            return self.backoff(feed_url, state)
 
-    @tasks.loop(minutes=30)
-    async def news_update(self):
+        state["failures"] = 0
+        if fetched is None:
+            return self.interval(feed_url, state)
+
+        entries, validators = fetched
+        if entries:
+            new_entries = self.new_entries(entries, state)
+            # Entries are only marked as posted once archived and queued, a failure
+            # in between leaves them to the next poll rather than losing them
+            await self.archive.add(
+                [
+                    {
+                        "id": entry["id"],
+                        "feed": feed_url,
+                        "source": self.feeds[feed_url]["name"],
+                        "title": entry["title"],
+                        "text": entry["text"],
+                        "link": entry["link"],
+                        "published": entry["published"] or int(time.time()),
+                    }
+                    for entry in new_entries
+                ]
+            )
+            if new_entries:
+                self.deliver(self.feeds[feed_url], new_entries)
+            await self.sent_entries.add(feed_url, [entry["id"] for entry in new_entries])
+            self.learn_cadence(entries, state)
+        # Saved last, the next poll would be answered 304 and skip entries that failed
+        state.update(validators)
+        return self.interval(feed_url, state)
+
+    def new_entries(self, entries, state):
+        """Entries of a feed not posted yet."""
+        # Entries older than the newest one already seen are not looked at
+        watermark = state.get("watermark")
         new_entries = []
-        for feed_url, _ in self.feeds:
-            feed = feedparser.parse(feed_url)
-            if not feed.entries:
+        seen = set()
+        for entry in entries:
+            timestamp = entry["published"]
+            if watermark is not None and timestamp is not None and timestamp < watermark:
                 continue
+            if entry["id"] not in self.sent_entries and entry["id"] not in seen:
+                new_entries.append(entry)
+                seen.add(entry["id"])
+        return new_entries
+
+    def learn_cadence(self, entries, state):
+        """Move the watermark of a feed to its newest entry and update its learned cadence."""
+        watermark = state.get("watermark")
+        timestamps = [entry["published"] for entry in entries if entry["published"] is not None]
+        if watermark is not None:
+            timestamps = [timestamp for timestamp in timestamps if timestamp >= watermark]
+        if timestamps:
+            state["watermark"] = max(timestamps)
+            # Mean time between the entries published since the previous watermark, or
+            # between those listed by the feed on its first poll
+            start = watermark if watermark is not None else min(timestamps)
+            count = sum(timestamp > start for timestamp in timestamps)
+            if count:
+                gap = (state["watermark"] - start) / count
+                cadence = state.get("cadence", gap)
+                state["cadence"] = cadence + CADENCE_SMOOTHING * (gap - cadence)
+
+    def interval_bounds(self, feed_url):
+        feed = self.feeds.get(feed_url, {})
+        return (
+            feed.get("min_interval") or NEWS_MIN_INTERVAL,
+            feed.get("max_interval") or NEWS_MAX_INTERVAL,
+        )
 
-            for entry in feed.entries:
-                if entry.id not in self.sent_entries:
-                    new_entries.append((entry, feed_url))
-                    self.sent_entries.append(entry.id)
+    def interval(self, feed_url, state):
+        """Delay until the next poll of a feed, shorter for feeds publishing often."""
+        min_interval, max_interval = self.interval_bounds(feed_url)
+        expected = state.get("cadence", max_interval)
+        if state.get("watermark"):
+            # A feed silent for longer than usual is probably slowing down, but only up to
+            # a point, quiet nights must not leave it unpolled for hours
+            silence = time.time() - state["watermark"]
+            expected = max(expected, min(silence, MAX_SLOWDOWN * expected))
+        return min(max(expected / POLLS_PER_ENTRY, min_interval), max_interval)
 
-        if new_entries:
-            channel = self.bot.get_channel(self.channel_id)
-            if channel:
-                for entry, feed_url in new_entries:
-                    embed = self.create_embed(entry, feed_url)
-                    await channel.send(embed=embed)
+    def backoff(self, feed_url, state):
+        """Delay until the next poll of a failing feed, doubling with every failure."""
+        min_interval, max_interval = self.interval_bounds(feed_url)
+        state["failures"] = state.get("failures", 0) + 1
+        delay = max(self.interval(feed_url, state), min_interval * 2 ** state["failures"])
+        return min(delay, max_interval)
+
+    async def feed_autocomplete(
+        self, _: Interaction, current: str
+    ) -> list[app_commands.Choice[str]]:
+        return self.feed_index.choices(current)
+
+    @app_commands.command(description="Ajouter, supprimer ou lister les flux d'actualités.")
+    @app_commands.describe(
+        url="Adresse du flux RSS ou Atom.",
+        name="Nom affiché de la source.",
+        color="Couleur des messages, en hexadécimal (ex: #E74C3C).",
+        channel="Salon où publier les actualités du flux.",
+        min_interval="Délai minimum entre deux consultations du flux, en minutes.",
+        max_interval="Délai maximum entre deux consultations du flux, en minutes.",
+    )
+    @app_commands.check(is_owner)
+    @app_commands.choices(
+        option=[
+            app_commands.Choice(name="add", value="ajouté"),
+            app_commands.Choice(name="remove", value="supprimé"),
+            app_commands.Choice(name="list", value="list"),
+        ]
+    )
+    @app_commands.autocomplete(url=feed_autocomplete)
+    async def feed(
+        self,
+        interaction: Interaction,
+        option: app_commands.Choice[str],
+        url: str = None,
+        name: str = None,
+        color: str = None,
+        channel: TextChannel = None,
+        min_interval: app_commands.Range[int, 1] = None,
+        max_interval: app_commands.Range[int, 1] = None,
+    ):
+        if option.name == "list":
+            await self.list_feeds(interaction)
+            return
 
-            # Update the configuration file
-            ConfigManager.set("feeds", list(self.sent_entries))
+        if url is None:
+            await interaction.response.send_message("URL du flux manquante.", ephemeral=True)
+            return
+
+        match option.name:
+            case "add":
+                if not url.startswith(("http://", "https://")):
+                    await interaction.response.send_message("URL invalide.", ephemeral=True)
+                    return
+                try:
+                    color = int(color.lstrip("#"), 16) if color else None
+                except ValueError:
+                    await interaction.response.send_message(
+                        "Couleur invalide - #RRGGBB.", ephemeral=True
+                    )
+                    return
+
+                current = self.feeds.get(url, {})
+                lower = min_interval * 60 if min_interval else current.get("min_interval")
+                upper = max_interval * 60 if max_interval else current.get("max_interval")
+                if (lower or NEWS_MIN_INTERVAL) > (upper or NEWS_MAX_INTERVAL):
+                    await interaction.response.send_message(
+                        "Le délai minimum dépasse le délai maximum.", ephemeral=True
+                    )
+                    return
+
+                # Adding a registered feed updates the given settings
+                feed = self.feeds.setdefault(
+                    url,
+                    {
+                        "url": url,
+                        "name": urlparse(url).hostname or url,
+                        "color": Colour.default().value,
+                        "channel": None,
+                        "min_interval": None,
+                        "max_interval": None,
+                    },
+                )
+                if name and name != feed["name"]:
+                    previous, feed["name"] = feed["name"], name
+                    self.forget_source(previous)
+                if color is not None:
+                    feed["color"] = color
+                if channel is not None:
+                    feed["channel"] = channel.id
+                if min_interval is not None:
+                    feed["min_interval"] = min_interval * 60
+                if max_interval is not None:
+                    feed["max_interval"] = max_interval * 60
+                self.feed_index.add(url)
+                self.source_index.add(feed["name"])
+
+                # Polled right away, then at the pace of its activity
+                if url not in self.polls:
+                    self.scheduler.schedule(url, time.time())
+            case "remove":
+                feed = self.feeds.pop(url, None)
+                if feed is None:
+                    await interaction.response.send_message("Flux non trouvé.", ephemeral=True)
+                    return
+                self.feed_index.remove(url)
+                self.forget_source(feed["name"])
+                self.scheduler.cancel(url)
+                self.feed_state.pop(url, None)
+                ConfigManager.set("feed_state", self.feed_state)
+
+        ConfigManager.set("news_feeds", list(self.feeds.values()))
+        await interaction.response.send_message(
+            f"Flux {feed['name']} {option.value}.", ephemeral=True
+        )
+
+    def forget_source(self, name):
+        """Remove `name` from the sources suggested, unless another feed still uses it."""
+        if all(feed["name"] != name for feed in self.feeds.values()):
+            self.source_index.remove(name)
+
+    async def list_feeds(self, interaction: Interaction):
+        fields = []
+        for feed in sorted(self.feeds.values(), key=lambda feed: feed["name"].lower()):
+            state = self.feed_state.get(feed["url"], {})
+            channel = f"<#{feed['channel'] or self.channel_id}>"
+            next_poll = f"<t:{int(state['next_poll'])}:R>" if "next_poll" in state else "-"
+            fields.append(
+                (feed["name"], f"{feed['url']}\n{channel} - prochaine consultation {next_poll}")
+            )
+        if not fields:
+            fields.append(("Aucun flux", "Ajoutez-en avec /feed add."))
 
-    @news_update.before_loop
-    async def before_news_update(self):
-        await self.bot.wait_until_ready()
+        section = {"title": f"Flux d'actualités ({len(self.feeds)})", "fields": fields}
+        pages = paginate(render([section]))
+        await interaction.response.send_message(embeds=pages[0], ephemeral=True)
+        for page in pages[1:]:
+            await interaction.followup.send(embeds=page, ephemeral=True)
 
 
 async def setup(bot: commands.Bot):
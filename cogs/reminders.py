@@ -1,12 +1,23 @@
-from datetime import datetime, timedelta
+import asyncio
+import time
+from datetime import datetime
 
-from dateparser import parse
-from discord import Embed, Interaction, NotFound, app_commands
-from discord.ext import commands, tasks
+from discord import Interaction, app_commands
+from discord.ext import commands
 
 from config import CALENDAR_CHANNEL, ConfigManager
+from utils.autocomplete import AutocompleteIndex
+from utils.dates import parse_date, to_timestamp, warm_up
+from utils.render import render
+from utils.scheduler import TimerHeap
 
-# TODO: Handle Timezone for reminders
+# Notifications sent before each event, as (seconds before the event, label)
+NOTIFICATIONS = [
+    (7 * 24 * 3600, "1 semaine"),
+    (24 * 3600, "1 jour"),
+    (3600, "1 heure"),
+    (0, None),
+]
 
 
 class Reminders(commands.Cog, name="reminders"):
@@ -14,8 +25,32 @@ class Reminders(commands.Cog, name="reminders"):
         self.bot = bot
         self.reminders = ConfigManager.get("reminders", [])
 
-        # Start the reminder check task
-        self.check_reminders.start()
+        # The calendar used to be a single message, it becomes the first shard
+        message_id = ConfigManager.get("calendar_message_id")
+        if message_id is not None:
+            ConfigManager.set("calendar_shards", [{"message_ids": [message_id], "sections": []}])
+            ConfigManager.remove("calendar_message_id")
+
+        # Next notification of every event, keyed by (course, event)
+        self.scheduler = TimerHeap(self.notify)
+        # Autocomplete indexes of the courses, and of the events of each course
+        self.course_index = AutocompleteIndex()
+        self.event_indexes = {}
+        for reminder in self.reminders:
+            self.course_index.add(reminder["name"])
+            self.event_indexes[reminder["name"]] = AutocompleteIndex(
+                event["name"] for event in reminder["fields"]
+            )
+            for event in reminder["fields"]:
+                self.schedule_event(reminder, event)
+
+    async def cog_load(self):
+        self.scheduler.start()
+        # Load the dateparser language data now rather than on the first /reminder
+        self.warm_up_task = asyncio.create_task(asyncio.to_thread(warm_up))
+
+    async def cog_unload(self):
+        self.scheduler.stop()
 
     @app_commands.command(
         name="timezone", description="Définir le fuseau horaire pour les rappels."
@@ -44,8 +79,8 @@ class Reminders(commands.Cog, name="reminders"):
     )
     async def timezone_command(self, interaction: Interaction, timezone: str):
         """
-        Set the timezone for the reminders.
-        This is a placeholder function and should be implemented.
+        Set the timezone reminder dates are entered in.
+        Existing reminders keep their instant, only new dates are affected.
         """
 
         ConfigManager.set("reminder_timezone", timezone)
@@ -56,27 +91,15 @@ class Reminders(commands.Cog, name="reminders"):
     async def course_autocomplete(
         self, _: Interaction, current: str
     ) -> list[app_commands.Choice[str]]:
-        courses = [reminder["name"] for reminder in self.reminders]
-        return [
-            app_commands.Choice(name=course, value=course)
-            for course in courses
-            if current.lower() in course.lower()
-        ]
+        return self.course_index.choices(current)
 
     async def event_autocomplete(
         self, interaction: Interaction, current: str
     ) -> list[app_commands.Choice[str]]:
-        option = interaction.namespace.option
-        course = interaction.namespace.course
-        courses = [reminder["name"] for reminder in self.reminders]
-        if option not in ["2", "3"] and course not in courses:
+        index = self.event_indexes.get(interaction.namespace.course)
+        if index is None:
             return []
-
-        return [
-            app_commands.Choice(name=field["name"], value=field["name"])
-            for field in self.reminders[courses.index(course)]["fields"]
-            if current.lower() in field["name"].lower()
-        ]
+        return index.choices(current)
 
     @app_commands.command(name="reminder", description="Etablit un rappel pour un événement.")
     @app_commands.describe(
@@ -104,294 +127,190 @@ class Reminders(commands.Cog, name="reminders"):
         description: str = "",
         modality: str = "",
     ):
+        # Dates are entered in the configured zone and stored as UTC epoch seconds
+        zone = ConfigManager.reminder_zone()
         try:
-            if " " not in date:
-                date += " 23:59"
-            try:
-                reminder_date = datetime.strptime(date, "%d/%m/%Y %H:%M")
-            except ValueError:
-                reminder_date = parse(
-                    date,
-                    languages=["fr", "en"],
-                    settings={
-                        "RETURN_AS_TIMEZONE_AWARE": False,
-                        "PREFER_DATES_FROM": "future",
-                        "PREFER_DAY_OF_MONTH": "first",
-                        "PREFER_LOCALE_DATE_ORDER": True,
-                        "PREFER_MONTH_OF_YEAR": "current",
-                    },
-                )
-                if reminder_date.hour == 0 and reminder_date.minute == 0:
-                    reminder_date = reminder_date.replace(hour=23, minute=59)
-
-                if not reminder_date:
-                    raise ValueError("Invalid date format") from ValueError
-
-            reminder_timestamp = f"<t:{int(reminder_date.timestamp())}:R>"
-            calendar_message_id = ConfigManager.get("calendar_message_id", 0)
-            calendar_channel = self.bot.get_channel(CALENDAR_CHANNEL.id)
-
-            if description:
-                description = f"{description}\n\n"
-            if modality:
-                modality = f"\n\n``{modality}``"
-
-            match option.name:
-                case "add":
-                    reminder = {
-                        "name": course,
-                        "fields": [
-                            {
-                                "name": event,
-                                "date": f"{reminder_date.date().__str__()} {reminder_date.time().__str__()[:5]}",
-                                "description": description,
-                                "modality": modality,
-                            }
-                        ],
-                    }
-
-                    try:
-                        msg = await calendar_channel.fetch_message(calendar_message_id)
-                        for embed in msg.embeds:
-                            if embed.title == course.upper():
-                                embed.add_field(
-                                    name=f"__{event}__",
-                                    value=f"{description}Echéance: {reminder_timestamp}{modality}",
-                                    inline=False,
-                                )
-                                embed.fields.sort(
-                                    key=lambda field: datetime.fromtimestamp(
-                                        int(field.value.split("Echéance: <t:")[1].split(":")[0])
-                                    ),
-                                    reverse=True,
-                                )
-                                msg.embeds.sort(
-                                    key=lambda embed: datetime.fromtimestamp(
-                                        int(
-                                            embed.fields[-1]
-                                            .value.split("Echéance: <t:")[1]
-                                            .split(":")[0]
-                                        )
-                                    ),
-                                    reverse=True,
-                                )
-                                await msg.edit(embeds=msg.embeds)
-                                break
-                        else:
-                            embed = Embed(title=course.upper())
-                            embed.add_field(
-                                name=f"__{event}__",
-                                value=f"{description}Echéance: {reminder_timestamp}{modality}",
-                                inline=False,
-                            )
-                            msg.embeds.append(embed)
-                            msg.embeds.sort(
-                                key=lambda embed: datetime.fromtimestamp(
-                                    int(
-                                        embed.fields[-1]
-                                        .value.split("Echéance: <t:")[1]
-                                        .split(":")[0]
-                                    )
-                                ),
-                                reverse=True,
-                            )
-                            await msg.edit(embeds=msg.embeds)
-                    except NotFound:
-                        embed = Embed(title=course.upper())
-                        embed.add_field(
-                            name=f"__{event}__",
-                            value=f"{description}Echéance: {reminder_timestamp}{modality}",
-                            inline=False,
-                        )
-                        msg = await calendar_channel.send(embed=embed)
-                        ConfigManager.set("calendar_message_id", msg.id)
-
-                    for existing_reminder in self.reminders:
-                        if existing_reminder["name"] == course:
-                            existing_reminder["fields"].append(reminder["fields"][0])
-                            break
-                    else:
-                        self.reminders.append(reminder)
-                    ConfigManager.set("reminders", self.reminders)
-                    await interaction.response.send_message(
-                        f"Rappel créé pour {reminder_timestamp}", ephemeral=True
-                    )
-                case "edit":
-                    try:
-                        msg = await calendar_channel.fetch_message(calendar_message_id)
-                        for embed in msg.embeds:
-                            if embed.title == course.upper():
-                                for index, field in enumerate(embed.fields):
-                                    if event in field.name:
-                                        embed.set_field_at(
-                                            index,
-                                            name=f"__{event}__",
-                                            value=f"{description}Echéance: {reminder_timestamp}{modality}",
-                                            inline=False,
-                                        )
-                                        embed.fields.sort(
-                                            key=lambda field: datetime.fromtimestamp(
-                                                int(
-                                                    field.value.split("Echéance: <t:")[1].split(
-                                                        ":"
-                                                    )[0]
-                                                )
-                                            ),
-                                            reverse=True,
-                                        )
-                                        msg.embeds.sort(
-                                            key=lambda embed: datetime.fromtimestamp(
-                                                int(
-                                                    embed.fields[-1]
-                                                    .value.split("Echéance: <t:")[1]
-                                                    .split(":")[0]
-                                                )
-                                            ),
-                                            reverse=True,
-                                        )
-                                        await msg.edit(embeds=msg.embeds)
-                                        for existing_reminder in self.reminders:
-                                            if existing_reminder["name"] == course:
-                                                for field in existing_reminder["fields"]:
-                                                    if field["name"] == event:
-                                                        field["date"] = (
-                                                            f"{reminder_date.date().__str__()} {reminder_date.time().__str__()[:5]}"
-                                                        )
-                                                        field["description"] = description
-                                                        field["modality"] = modality
-                                                        break
-                                                break
-
-                                        ConfigManager.set("reminders", self.reminders)
-
-                                        await interaction.response.send_message(
-                                            f"Rappel pour l'événement '{event}' du cours '{course}' modifié.",
-                                            ephemeral=True,
-                                        )
-                                        break
-                                else:
-                                    await interaction.response.send_message(
-                                        "Événement non trouvé.", ephemeral=True
-                                    )
-                                break
-                        else:
-                            await interaction.response.send_message(
-                                "Cours non trouvé.", ephemeral=True
-                            )
-                    except NotFound:
-                        await interaction.response.send_message(
-                            "Aucun message de rappel trouvé.", ephemeral=True
-                        )
-                case "remove":
-                    for existing_reminder in self.reminders:
-                        if existing_reminder["name"] == course:
-                            for field in existing_reminder["fields"]:
-                                if field["name"] == event:
-                                    await self.remove_event(
-                                        existing_reminder, field, calendar_channel
-                                    )
-                                    await interaction.response.send_message(
-                                        f"Rappel pour l'événement '{event}' du cours '{course}' supprimé.",
-                                        ephemeral=True,
-                                    )
-                                    break
-                            else:
-                                await interaction.response.send_message(
-                                    "Événement non trouvé.", ephemeral=True
-                                )
-                            break
-                    else:
-                        await interaction.response.send_message("Cours non trouvé.", ephemeral=True)
-
+            reminder_date = parse_date(date, datetime.now(zone).replace(tzinfo=None))
         except ValueError:
             await interaction.response.send_message(
                 "Format invalide - JJ/MM/AAAA <HH:II>.", ephemeral=True
             )
+            return
 
-    @tasks.loop(minutes=1)
-    async def check_reminders(self):
-        now = datetime.now()
+        timestamp = to_timestamp(reminder_date, zone)
+        reminder_timestamp = f"<t:{timestamp}:R>"
         calendar_channel = self.bot.get_channel(CALENDAR_CHANNEL.id)
-        for reminder in self.reminders:
-            for event in reminder["fields"]:
-                event_time = datetime.strptime(event["date"], "%Y-%m-%d %H:%M")
-                if (
-                    now + timedelta(hours=1) - timedelta(seconds=30)
-                    <= event_time
-                    <= now + timedelta(hours=1) + timedelta(seconds=30)
-                ):
-                    await calendar_channel.send(
-                        f":warning: L'échéance *{event['name']}* du cours "
-                        + f"**{reminder['name'].upper()}** a lieu dans 1 heure !\n|| @everyone ||",
-                        delete_after=3600,
-                    )
-                elif (
-                    now + timedelta(days=1) - timedelta(seconds=30)
-                    <= event_time
-                    <= now + timedelta(days=1) + timedelta(seconds=30)
-                ):
-                    await calendar_channel.send(
-                        f":warning: L'échéance *{event['name']}* du cours "
-                        + f"**{reminder['name'].upper()}** a lieu dans 1 jour !\n|| @everyone ||",
-                        delete_after=3600,
-                    )
-                elif (
-                    now + timedelta(weeks=1) - timedelta(seconds=30)
-                    <= event_time
-                    <= now + timedelta(weeks=1) + timedelta(seconds=30)
-                ):
-                    await calendar_channel.send(
-                        f":warning: L'échéance *{event['name']}* du cours "
-                        + f"**{reminder['name'].upper()}** a lieu dans 1 semaine !\n|| @everyone ||",
-                        delete_after=3600,
-                    )
-                elif event_time <= now:
-                    await calendar_channel.send(
-                        f":warning: L'échéance *{event['name']}* du cours "
-                        + f"**{reminder['name'].upper()}** vient d'avoir lieu !\n|| @everyone ||",
-                        delete_after=60,
+
+        if description:
+            description = f"{description}\n\n"
+        if modality:
+            modality = f"\n\n``{modality}``"
+
+        reminder = self.find_course(course)
+        match option.name:
+            case "add":
+                # Events are identified by their course and name
+                if reminder is not None and self.find_event(reminder, event) is not None:
+                    await interaction.response.send_message(
+                        f"L'événement '{event}' existe déjà dans le cours '{course}'.",
+                        ephemeral=True,
                     )
-                    await self.remove_event(reminder, event, calendar_channel)
+                    return
+                if reminder is None:
+                    reminder = {"name": course, "fields": []}
+                    self.reminders.append(reminder)
+                field = {
+                    "name": event,
+                    "timestamp": timestamp,
+                    "timezone": zone.key,
+                    "description": description,
+                    "modality": modality,
+                }
+                reminder["fields"].append(field)
+                self.course_index.add(course)
+                self.event_indexes.setdefault(course, AutocompleteIndex()).add(event)
 
-    async def remove_event(self, reminder, event, calendar_channel):
-        try:
-            msg = await calendar_channel.fetch_message(ConfigManager.get("calendar_message_id", 0))
-            for embed in msg.embeds:
-                if embed.title == reminder["name"].upper():
-                    fields_to_remove = [
-                        field for field in embed.fields if event["name"] in field.name
-                    ]
-                    for field in fields_to_remove:
-                        embed.remove_field(embed.fields.index(field))
-                    if not embed.fields:
-                        msg.embeds.remove(embed)
-                        if not msg.embeds:
-                            await msg.delete()
-                            ConfigManager.remove("calendar_message_id")
-                            break
-                    else:
-                        msg.embeds.sort(
-                            key=lambda embed: datetime.fromtimestamp(
-                                int(embed.fields[-1].value.split("Echéance: <t:")[1].split(":")[0])
-                            ),
-                            reverse=True,
-                        )
-                    await msg.edit(embeds=msg.embeds)
-                    break
-        except NotFound:
-            pass
+                self.schedule_event(reminder, field)
+                ConfigManager.set("reminders", self.reminders)
+                self.update_calendar(calendar_channel, reminder["name"])
+                await interaction.response.send_message(
+                    f"Rappel créé pour {reminder_timestamp}", ephemeral=True
+                )
+            case "edit":
+                if reminder is None:
+                    await interaction.response.send_message("Cours non trouvé.", ephemeral=True)
+                    return
+                field = self.find_event(reminder, event)
+                if field is None:
+                    await interaction.response.send_message("Événement non trouvé.", ephemeral=True)
+                    return
+
+                field["timestamp"] = timestamp
+                field["timezone"] = zone.key
+                field["description"] = description
+                field["modality"] = modality
+                self.event_indexes[course].add(event)
 
+                self.schedule_event(reminder, field)
+                ConfigManager.set("reminders", self.reminders)
+                self.update_calendar(calendar_channel, reminder["name"])
+                await interaction.response.send_message(
+                    f"Rappel pour l'événement '{event}' du cours '{course}' modifié.",
+                    ephemeral=True,
+                )
+            case "remove":
+                if reminder is None:
+                    await interaction.response.send_message("Cours non trouvé.", ephemeral=True)
+                    return
+                field = self.find_event(reminder, event)
+                if field is None:
+                    await interaction.response.send_message("Événement non trouvé.", ephemeral=True)
+                    return
+
+                await self.remove_event(reminder, field, calendar_channel)
+                await interaction.response.send_message(
+                    f"Rappel pour l'événement '{event}' du cours '{course}' supprimé.",
+                    ephemeral=True,
+                )
+
+    def find_course(self, course):
+        return next((reminder for reminder in self.reminders if reminder["name"] == course), None)
+
+    def find_event(self, reminder, event):
+        return next((field for field in reminder["fields"] if field["name"] == event), None)
+
+    def render_calendar(self, courses):
+        """
+        Build the embeds of each of `courses`, courses and events sorted by latest
+        deadline first.
+        """
+        rendered = {}
+        for reminder in sorted(
+            (reminder for reminder in self.reminders if reminder["name"] in courses),
+            key=lambda reminder: min(event["timestamp"] for event in reminder["fields"]),
+            reverse=True,
+        ):
+            fields = [
+                (
+                    f"__{event['name']}__",
+                    f"{event['description']}Echéance: <t:{event['timestamp']}:R>"
+                    + event["modality"],
+                )
+                for event in sorted(
+                    reminder["fields"], key=lambda event: event["timestamp"], reverse=True
+                )
+            ]
+            rendered[reminder["name"]] = render(
+                [{"title": reminder["name"].upper(), "fields": fields}]
+            )
+        return rendered
+
+    def update_calendar(self, calendar_channel, course):
+        """Render `course` into the calendar message holding it, creating one if needed."""
+        # Courses missing from the board (e.g. after a failed send) are placed as well
+        courses = {reminder["name"] for reminder in self.reminders}
+        courses -= self.bot.renderer.sections("calendar_shards")
+        self.bot.renderer.update_sections(
+            "calendar_shards", calendar_channel, courses | {course}, self.render_calendar
+        )
+
+    def schedule_event(self, reminder, event, now=None):
+        """Schedule the next notification due for `event`."""
+        now = time.time() if now is None else now
+        for offset, _ in NOTIFICATIONS:
+            if event["timestamp"] - offset > now:
+                deadline = event["timestamp"] - offset
+                break
+        else:
+            # Only the expiry is left, and it may already be due
+            deadline = event["timestamp"]
+        self.scheduler.schedule((reminder["name"], event["name"]), deadline, (reminder, event))
+
+    def unschedule_event(self, reminder, event):
+        self.scheduler.cancel((reminder["name"], event["name"]))
+
+    async def notify(self, _, payload):
+        """Send the notification of an event whose deadline has been reached."""
+        reminder, event = payload
+        await self.bot.wait_until_ready()
+        calendar_channel = self.bot.get_channel(CALENDAR_CHANNEL.id)
+
+        now = time.time()
+        due = [n for n in NOTIFICATIONS if event["timestamp"] - n[0] <= now]
+        if not due:
+            self.schedule_event(reminder, event, now)
+            return
+        # After a late wake-up, only announce the most recent notification that is due
+        offset, label = due[-1]
+
+        if offset:
+            await calendar_channel.send(
+                f":warning: L'échéance *{event['name']}* du cours "
+                + f"**{reminder['name'].upper()}** a lieu dans {label} !\n|| @everyone ||",
+                delete_after=3600,
+            )
+            self.schedule_event(reminder, event, now)
+        else:
+            await calendar_channel.send(
+                f":warning: L'échéance *{event['name']}* du cours "
+                + f"**{reminder['name'].upper()}** vient d'avoir lieu !\n|| @everyone ||",
+                delete_after=60,
+            )
+            await self.remove_event(reminder, event, calendar_channel)
+
+    async def remove_event(self, reminder, event, calendar_channel):
+        self.unschedule_event(reminder, event)
         reminder["fields"] = [
             field for field in reminder["fields"] if field["name"] != event["name"]
         ]
+        self.event_indexes[reminder["name"]].remove(event["name"])
         if not reminder["fields"]:
             self.reminders.remove(reminder)
+            self.course_index.remove(reminder["name"])
+            del self.event_indexes[reminder["name"]]
 
         ConfigManager.set("reminders", self.reminders)
-
-    @check_reminders.before_loop
-    async def before_check_reminders(self):
-        await self.bot.wait_until_ready()
+        self.update_calendar(calendar_channel, reminder["name"])
 
 
 async def setup(bot: commands.Bot):
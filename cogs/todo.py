@@ -1,56 +1,55 @@
-from discord import Embed, Interaction, app_commands
+from discord import Interaction, app_commands
 from discord.ext import commands
 from loguru import logger
 
 from config import TODO_CHANNEL, ConfigManager
+from utils.autocomplete import AutocompleteIndex
+from utils.render import render
 
 EMOJIS = ["1️⃣", "2️⃣", "3️⃣", "4️⃣", "5️⃣", "6️⃣", "7️⃣", "8️⃣", "9️⃣", "🔟"]
 
 
-def update_embed(embeds, todos):
-    new_value = "\n".join(
-        [
-            f"{i}. {'✅' if tool['completed'] else '❌'}**"
-            + f"{' - ' + tool['task'] if tool['task'] else ''}**"
-            for i, tool in enumerate(todos, 1)
-        ]
-    )
-
-    for embed in embeds:
-        try:
-            embed.set_field_at(0, name="__MY TASKS__", value=new_value, inline=False)
-            break
-        except IndexError:
-            # If the field does not exist, we will add it later
-            continue
+def render_todos(todos, footer=None):
+    """Build the embeds of the todos board."""
+    if todos:
+        tasks = "\n".join(
+            [
+                f"{i}. {'✅' if todo['completed'] else '❌'}**"
+                + f"{' - ' + todo['task'] if todo['task'] else ''}**"
+                for i, todo in enumerate(todos, 1)
+            ]
+        )
+        section = {
+            "title": "Tâches à faire 📝",
+            "description": "Liste des Tâches à faire",
+            "fields": [("__MY TASKS__", tasks)],
+        }
     else:
-        embed.add_field(name="__MY TASKS__", value=new_value, inline=False)
-        return
+        section = {
+            "title": "Toutes les tâches sont terminées ! 🎉",
+            "description": "Liste des Tâches à faire",
+        }
+    return render([section], footer=footer)
 
 
 class Todo(commands.Cog, name="todo"):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.todos = ConfigManager.get("todos", [])
-
-        self.message_id = ConfigManager.get("todos_message_id")
+        # Footer of the board, naming who last changed it
+        self.footer = None
+        self.task_index = AutocompleteIndex(todo["task"] for todo in self.todos)
 
     async def task_autocomplete(
         self, interaction: Interaction, current: str
     ) -> list[app_commands.Choice[str]]:
         option = interaction.namespace.option
         if option == "3":
-            tasks = [
-                todo["task"] for todo in ConfigManager.get("todos", []) if not todo["completed"]
-            ]
-        else:
-            tasks = [todo["task"] for todo in ConfigManager.get("todos", [])]
-
-        return [
-            app_commands.Choice(name=task, value=task)
-            for task in tasks
-            if current.lower() in task.lower()
-        ]
+            completed = {
+                todo["task"] for todo in ConfigManager.get("todos", []) if todo["completed"]
+            }
+            return self.task_index.choices(current, where=lambda task: task not in completed)
+        return self.task_index.choices(current)
 
     @app_commands.command(name="todo")
     @app_commands.describe(
@@ -80,76 +79,60 @@ class Todo(commands.Cog, name="todo"):
         todos_channel = interaction.guild.get_channel(TODO_CHANNEL.id)
         logger.info(f"Todos channel: {todos_channel}")
 
-        try:
-            # Try to fetch the todos message
-            msg = await todos_channel.fetch_message(self.message_id)
-        except Exception:
-            # If it doesn't exist, create a new message with an empty embed
-            msg = await todos_channel.send(
-                embeds=[Embed(title="Tâches", description="Liste des Tâches à faire")],
-            )
-            ConfigManager.set("todos_message_id", msg.id)
-            self.message_id = msg.id
-
         formatted_time = interaction.created_at.strftime("%Y-%m-%d %H:%M:%S")
+        footer = {
+            "text": f"Last update by {interaction.user.display_name} at {formatted_time}",
+            "icon_url": interaction.user.avatar.url,
+        }
 
         todos = ConfigManager.get("todos", [])
         logger.info(f"Current todos: {todos}")
 
         match option.name:
             case "add":
-                store = {"task": task, "completed": False}
-
-                if len(todos) < 10:
-                    todos.append(store)
-                    update_embed(msg.embeds, todos)
-                    msg.embeds[-1].set_footer(
-                        text=f"Last update by {interaction.user.display_name} at {formatted_time}",
-                        icon_url=interaction.user.avatar.url,
-                    )
-                    msg.embeds[-1].title = "Tâches à faire 📝"
-                    await msg.edit(embeds=msg.embeds)
-                else:
-                    interaction.response.send_message(
+                if len(todos) >= 10:
+                    await interaction.response.send_message(
                         "Limite de 10 tâches atteinte.", ephemeral=True
                     )
                     return
 
-                ConfigManager.set("todos", todos)
-
+                todos.append({"task": task, "completed": False})
+                self.task_index.add(task)
+                self.footer = footer
                 await interaction.response.send_message(f"Tâche {task} créé", ephemeral=True)
 
             case "remove" | "complete":
-                for index, existing_todo in enumerate(todos, 1):
-                    if existing_todo["task"].lower() == task.lower():
-                        if option.name == "complete":
-                            todos[index - 1]["completed"] = True
-                            await interaction.response.send_message(
-                                f"Tâche {task} marquée comme terminée", ephemeral=True
-                            )
-                        else:
-                            del todos[index - 1]
-
-                            msg.embeds[-1].set_footer(
-                                text=f"Last update by {interaction.user.display_name} at "
-                                + f"{formatted_time}",
-                                icon_url=interaction.user.avatar.url,
-                            )
-                            await interaction.response.send_message(
-                                f"Tâche {task} supprimée", ephemeral=True
-                            )
-
-                        if all(todo["completed"] for todo in todos):
-                            msg.embeds[-1].title = "Toutes les tâches sont terminées ! 🎉"
-                            todos.clear()
-
-                        update_embed(msg.embeds, todos)
-                        await msg.edit(embeds=msg.embeds)
-                        ConfigManager.set("todos", todos)
-
-                        break
-                else:
+                index = next(
+                    (i for i, todo in enumerate(todos) if todo["task"].lower() == task.lower()),
+                    None,
+                )
+                if index is None:
                     await interaction.response.send_message("Tâche non trouvée.", ephemeral=True)
+                    return
+
+                if option.name == "complete":
+                    todos[index]["completed"] = True
+                    await interaction.response.send_message(
+                        f"Tâche {task} marquée comme terminée", ephemeral=True
+                    )
+                else:
+                    self.task_index.remove(todos[index]["task"])
+                    del todos[index]
+                    self.footer = footer
+                    await interaction.response.send_message(
+                        f"Tâche {task} supprimée", ephemeral=True
+                    )
+
+                if all(todo["completed"] for todo in todos):
+                    todos.clear()
+                    self.task_index.clear()
+
+        ConfigManager.set("todos", todos)
+        self.bot.renderer.update(
+            "todos_message_id",
+            todos_channel,
+            lambda: render_todos(ConfigManager.get("todos", []), self.footer),
+        )
 
 
 async def setup(bot: commands.Bot):
@@ -1,61 +1,66 @@
-from discord import Embed, Interaction, app_commands
+from discord import Interaction, app_commands
 from discord.ext import commands
 
 from config import TOOLS_CHANNEL, ConfigManager
-
-
-def update_embed(embeds, category, tools):
-    new_value = "\n".join(
-        [
-            f"{i}. **{tool['tool']}**{': ' + tool['description'] if tool['description'] else ''}"
-            for i, tool in enumerate(tools, 1)
-        ]
-    )
-    for embed in embeds:
-        for index, field in enumerate(embed.fields):
-            if field.name == f"__{category.upper()}__":
-                embed.set_field_at(index, name=field.name, value=new_value, inline=False)
-                return
-    for embed in embeds:
-        if len(embed.fields) < 4:
-            embed.add_field(name=f"__{category.upper()}__", value=new_value, inline=False)
-            return
-    new_embed = Embed()
-    new_embed.add_field(name=f"__{category.upper()}__", value=new_value, inline=False)
-    embeds.append(new_embed)
+from utils.autocomplete import AutocompleteIndex
+from utils.render import render
+
+
+def render_tools(tools, footer=None):
+    """Build the embeds of the tools board, four categories per embed."""
+    fields = [
+        (
+            f"__{category['category'].upper()}__",
+            "\n".join(
+                [
+                    f"{i}. **{tool['tool']}**"
+                    + f"{': ' + tool['description'] if tool['description'] else ''}"
+                    for i, tool in enumerate(category["fields"], 1)
+                ]
+            ),
+        )
+        for category in tools
+        if category["fields"]
+    ]
+    section = {
+        "title": "Outils",
+        "description": "Liste des outils disponibles, par catégorie.",
+        "fields": fields,
+    }
+    return render([section], footer=footer, max_fields=4)
 
 
 class Tools(commands.Cog, name="tools"):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.message_id = ConfigManager.get("tools_message_id", 0)
+        # Footer of the board, naming who last changed it
+        self.footer = None
+
+        # Autocomplete indexes of the categories, and of the tools of each category
+        self.category_index = AutocompleteIndex()
+        self.tool_indexes = {}
+        for tools in ConfigManager.get("tools", []):
+            for field in tools["fields"]:
+                self.index_tool(tools["category"], field["tool"])
+
+    def index_tool(self, category, tool):
+        self.category_index.add(category)
+        index = self.tool_indexes.setdefault(category, AutocompleteIndex())
+        if tool is not None:
+            index.add(tool)
 
     async def category_autocomplete(
         self, _: Interaction, current: str
     ) -> list[app_commands.Choice[str]]:
-        categories = [tool["category"] for tool in ConfigManager.get("tools", [])]
-        return [
-            app_commands.Choice(name=category, value=category)
-            for category in categories
-            if current.lower() in category.lower()
-        ]
+        return self.category_index.choices(current)
 
     async def tool_autocomplete(
         self, interaction: Interaction, current: str
     ) -> list[app_commands.Choice[str]]:
-        option = interaction.namespace.option
-        category = interaction.namespace.category
-        tools = ConfigManager.get("tools", [])
-        categories = [tool["category"] for tool in tools]
-
-        if option not in ["2", "3"] and category not in categories:
+        index = self.tool_indexes.get(interaction.namespace.category)
+        if index is None:
             return []
-
-        return [
-            app_commands.Choice(name=field["tool"], value=field["tool"])
-            for field in tools[categories.index(category)]["fields"]
-            if current.lower() in field["tool"].lower()
-        ]
+        return index.choices(current)
 
     @app_commands.command(description="Ajouter, modifier ou supprimer un outil.")
     @app_commands.describe(
@@ -83,22 +88,11 @@ class Tools(commands.Cog, name="tools"):
     ):
         tools_channel = interaction.guild.get_channel(TOOLS_CHANNEL.id)
 
-        try:
-            # Try to fetch the tools message
-            msg = await tools_channel.fetch_message(self.message_id)
-        except Exception:
-            # If it doesn't exist, create a new message with an empty embed
-            msg = await tools_channel.send(
-                embeds=[
-                    Embed(
-                        title="Outils", description="Liste des outils disponibles, par catégorie."
-                    )
-                ],
-            )
-            ConfigManager.set("tools_message_id", msg.id)
-            self.message_id = msg.id
-
         formatted_time = interaction.created_at.strftime("%Y-%m-%d %H:%M:%S")
+        footer = {
+            "text": f"Last update by {interaction.user.display_name} at {formatted_time}",
+            "icon_url": interaction.user.avatar.url,
+        }
 
         tools = ConfigManager.get("tools", [])
 
@@ -112,23 +106,11 @@ class Tools(commands.Cog, name="tools"):
                 for existing_tool in tools:
                     if existing_tool["category"].lower() == category.lower():
                         existing_tool["fields"].append(store["fields"][0])
-                        update_embed(msg.embeds, category, existing_tool["fields"])
-                        msg.embeds[-1].set_footer(
-                            text=f"Last update by {interaction.user.display_name} at {formatted_time}",
-                            icon_url=interaction.user.avatar.url,
-                        )
-                        await msg.edit(embeds=msg.embeds)
+                        self.index_tool(existing_tool["category"], tool)
                         break
                 else:
                     tools.append(store)
-                    update_embed(msg.embeds, category, store["fields"])
-                    msg.embeds[-1].set_footer(
-                        text=f"Last update by {interaction.user.display_name} at {formatted_time}",
-                        icon_url=interaction.user.avatar.url,
-                    )
-                    await msg.edit(embeds=msg.embeds)
-
-                ConfigManager.set("tools", tools)
+                    self.index_tool(category, tool)
 
                 await interaction.response.send_message(
                     f"Outil {tool} créé dans la catégorie {category}", ephemeral=True
@@ -139,44 +121,44 @@ class Tools(commands.Cog, name="tools"):
                     if existing_tool["category"].lower() == category.lower():
                         if 0 <= index - 1 < len(existing_tool["fields"]):
                             t = existing_tool["fields"][index - 1]["tool"]
+                            self.tool_indexes[existing_tool["category"]].remove(t)
                             if option.name == "edit":
                                 if tool is not None:
                                     existing_tool["fields"][index - 1]["tool"] = tool
+                                self.index_tool(
+                                    existing_tool["category"],
+                                    existing_tool["fields"][index - 1]["tool"],
+                                )
                                 existing_tool["fields"][index - 1]["description"] = (
                                     description
                                     if description
                                     else existing_tool["fields"][index - 1]["description"]
                                 )
-                                update_embed(msg.embeds, category, existing_tool["fields"])
                             else:
                                 del existing_tool["fields"][index - 1]
-                                if existing_tool["fields"]:
-                                    update_embed(msg.embeds, category, existing_tool["fields"])
-                                else:
-                                    for embed in msg.embeds:
-                                        for field_index, field in enumerate(embed.fields):
-                                            if field.name == f"__{category.upper()}__":
-                                                embed.remove_field(field_index)
-                                                break
-                            msg.embeds[-1].set_footer(
-                                text=f"Last update by {interaction.user.display_name} at {formatted_time}",
-                                icon_url=interaction.user.avatar.url,
-                            )
-                            await msg.edit(embeds=msg.embeds)
                             await interaction.response.send_message(
                                 f"Outil {t} dans la catégorie {category} {option.value}.",
                                 ephemeral=True,
                             )
-                            ConfigManager.set("tools", tools)
                         else:
                             await interaction.response.send_message(
                                 "Index non trouvé.", ephemeral=True
                             )
+                            return
                         break
                 else:
                     await interaction.response.send_message(
                         "Catégorie non trouvée.", ephemeral=True
                     )
+                    return
+
+        ConfigManager.set("tools", tools)
+        self.footer = footer
+        self.bot.renderer.update(
+            "tools_message_id",
+            tools_channel,
+            lambda: render_tools(ConfigManager.get("tools", []), self.footer),
+        )
 
 
 async def setup(bot: commands.Bot):
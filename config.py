@@ -1,8 +1,14 @@
+import asyncio
 import json
 import os
 
 from discord import Guild, Object, TextChannel, VoiceChannel
 from dotenv import load_dotenv
+from loguru import logger
+from peewee import PeeweeException
+
+from database import MODELS, TABLES, Setting, db, migrate
+from utils.dates import get_zone, migrate_reminders
 
 # Load environment variables from .env file
 load_dotenv()
@@ -36,6 +42,46 @@ GOOGLE_CREDENTIALS_JSON = os.getenv("GOOGLE_CREDENTIALS_JSON")
 GOOGLE_CALENDAR_ID = os.getenv("GOOGLE_CALENDAR_ID")
 DAYS_IN_FUTURE = int(os.getenv("DAYS_IN_FUTURE", 90))  # Number of days to look ahead for events
 SYNC_INTERVAL = int(os.getenv("SYNC_INTERVAL", 60))  # In seconds
+SYNC_CONCURRENCY = int(os.getenv("SYNC_CONCURRENCY", 4))  # Discord event requests at once
+
+# Zone reminder dates are entered in, unless changed with /timezone
+REMINDER_TIMEZONE = os.getenv("REMINDER_TIMEZONE", "Europe/Paris")
+
+# Number of news feeds downloaded at the same time, and time (in seconds) allowed per feed
+NEWS_CONCURRENCY = int(os.getenv("NEWS_CONCURRENCY", 16))
+NEWS_FETCH_TIMEOUT = float(os.getenv("NEWS_FETCH_TIMEOUT", 20))
+
+# Bounds (in seconds) of the delay between two polls of a feed, adapted to its activity
+NEWS_MIN_INTERVAL = int(os.getenv("NEWS_MIN_INTERVAL", 5 * 60))
+NEWS_MAX_INTERVAL = int(os.getenv("NEWS_MAX_INTERVAL", 6 * 3600))
+# Maximum number of feed requests per hour, all feeds together
+NEWS_REQUEST_BUDGET = int(os.getenv("NEWS_REQUEST_BUDGET", 240))
+
+# When set, new entries are posted as one digest per feed every this many seconds
+NEWS_DIGEST_INTERVAL = int(os.getenv("NEWS_DIGEST_INTERVAL", 0))
+
+# Entries of different feeds at least this similar (0 to 1) within this many hours are
+# considered the same story, and posted once
+NEWS_DUPLICATE_THRESHOLD = float(os.getenv("NEWS_DUPLICATE_THRESHOLD", 0.6))
+NEWS_DUPLICATE_WINDOW = int(os.getenv("NEWS_DUPLICATE_WINDOW", 48))
+
+# Worker processes parsing the downloaded feeds, away from the event loop
+NEWS_PARSE_WORKERS = int(os.getenv("NEWS_PARSE_WORKERS", 2))
+
+# Posted news entries are remembered for this many days, and at most this many per feed
+NEWS_RETENTION_DAYS = int(os.getenv("NEWS_RETENTION_DAYS", 90))
+NEWS_RETENTION_COUNT = int(os.getenv("NEWS_RETENTION_COUNT", 1000))
+
+# Connections open at once to all hosts and to the same host, time (in seconds) allowed
+# per request, retries of failed requests and largest response accepted (in bytes)
+HTTP_CONNECTIONS = int(os.getenv("HTTP_CONNECTIONS", 100))
+HTTP_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_CONNECTIONS_PER_HOST", 8))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 20))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", 2))
+HTTP_MAX_SIZE = int(os.getenv("HTTP_MAX_SIZE", 5 * 1024 * 1024))
+
+# Maximum time (in seconds) a configuration change may stay in memory before being saved
+CONFIG_FLUSH_DELAY = float(os.getenv("CONFIG_FLUSH_DELAY", 5))
 
 # ============================================ #
 # COLORS
@@ -49,39 +95,179 @@ MAIN_COLOR = 0x476EFC
 
 
 class ConfigManager:
+    """
+    Configuration store persisted in the SQLite database.
+
+    Values are loaded lazily, one key at a time. List shaped keys (see `database.TABLES`)
+    live in their own table, every other key is a single `Setting` row.
+
+    Writes are write-behind: `set`, `append` and `remove` only mark the key dirty, and
+    the whole burst is flushed once, at most `CONFIG_FLUSH_DELAY` seconds later, from a
+    worker thread. A flush is a single transaction touching only the rows that changed.
+    """
+
+    # Legacy JSON document, imported once into the database
     path = "db/config.json"
     config = {}
 
+    # Last persisted state of each loaded key: a JSON string or a table snapshot
+    persisted = {}
+    # Keys modified since the last flush
+    dirty = set()
+    _flush_handle = None
+    _flush_task = None
+    _flush_lock = asyncio.Lock()
+
     @classmethod
     def load(cls):
-        if os.path.exists(cls.path):
-            with open(cls.path, encoding="utf-8") as f:
-                cls.config = json.load(f)
+        db.connect(reuse_if_open=True)
+        db.create_tables(MODELS, safe=True)
+        migrate(cls.reminder_zone())
+        cls.import_json()
+
+    @classmethod
+    def reminder_zone(cls):
+        """Time zone reminder dates are entered in."""
+        return get_zone(cls.get("reminder_timezone"), REMINDER_TIMEZONE)
+
+    @classmethod
+    def import_json(cls, path=None):
+        """One-shot import of the legacy JSON document, renamed once imported."""
+        path = path or cls.path
+        if not os.path.exists(path):
+            return
+
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if "reminders" in data:
+            migrate_reminders(
+                data["reminders"], get_zone(data.get("reminder_timezone"), REMINDER_TIMEZONE)
+            )
+        for key, value in data.items():
+            cls._ensure_loaded(key)
+            cls.config[key] = value
+        cls._write({key: cls._serialize(key) for key in data})
+
+        os.replace(path, f"{path}.imported")
+        logger.info(f"Imported {len(data)} configuration keys from {path}")
 
     @classmethod
     def get(cls, key, default=None):
+        cls._ensure_loaded(key)
         return cls.config.get(key, default)
 
     @classmethod
     def set(cls, key, value):
+        cls._ensure_loaded(key)
         cls.config[key] = value
-        cls.save()
+        cls.mark_dirty(key)
 
     @classmethod
     def append(cls, key, value):
+        cls._ensure_loaded(key)
         if key in cls.config and isinstance(cls.config[key], list):
             cls.config[key].append(value)
         else:
             cls.config[key] = [value]
-        cls.save()
+        cls.mark_dirty(key)
 
     @classmethod
     def remove(cls, key):
+        cls._ensure_loaded(key)
         if key in cls.config:
             del cls.config[key]
-            cls.save()
+            cls.mark_dirty(key)
+
+    @classmethod
+    def _ensure_loaded(cls, key):
+        if key in cls.persisted:
+            return
+
+        table = TABLES.get(key)
+        if table is not None:
+            value = table.read()
+            cls.persisted[key] = table.snapshot(value) if value is not None else {}
+        else:
+            row = Setting.get_or_none(Setting.key == key)
+            value = json.loads(row.value) if row else None
+            cls.persisted[key] = row.value if row else None
+
+        if value is not None:
+            cls.config[key] = value
+
+    @classmethod
+    def _serialize(cls, key):
+        """Snapshot the current value of `key` in the form it is persisted in."""
+        table = TABLES.get(key)
+        if key not in cls.config:
+            return {} if table is not None else None
+        if table is not None:
+            return table.snapshot(cls.config[key])
+        return json.dumps(cls.config[key], ensure_ascii=False)
+
+    @classmethod
+    def mark_dirty(cls, key):
+        """Schedule a flush for `key`, merging it with any write already pending."""
+        cls.dirty.add(key)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop (startup, shutdown or scripts), write through
+            cls.flush()
+            return
+
+        if cls._flush_handle is None:
+            cls._flush_handle = loop.call_later(CONFIG_FLUSH_DELAY, cls._start_flush, loop)
+
+    @classmethod
+    def _start_flush(cls, loop):
+        cls._flush_handle = None
+        # Keep a reference so the task is not garbage collected mid-write
+        cls._flush_task = loop.create_task(cls.flush_async())
+
+    @classmethod
+    async def flush_async(cls):
+        """Flush the dirty keys without blocking the event loop."""
+        if cls._flush_handle is not None:
+            cls._flush_handle.cancel()
+            cls._flush_handle = None
+
+        async with cls._flush_lock:
+            if not cls.dirty:
+                return
+            keys = set(cls.dirty)
+            cls.dirty.clear()
+            # Snapshot on the loop so the state is consistent, write in a thread
+            snapshots = {key: cls._serialize(key) for key in keys}
+            try:
+                await asyncio.to_thread(cls._write, snapshots)
+            except PeeweeException as e:
+                logger.error(f"Failed to save configuration: {e}")
+                cls.dirty |= keys
+
+    @classmethod
+    def flush(cls):
+        """Flush the dirty keys synchronously, used when no event loop is running."""
+        if cls._flush_handle is not None:
+            cls._flush_handle.cancel()
+            cls._flush_handle = None
+
+        if cls.dirty:
+            keys = set(cls.dirty)
+            cls.dirty.clear()
+            cls._write({key: cls._serialize(key) for key in keys})
 
     @classmethod
-    def save(cls):
-        with open(cls.path, "w", encoding="utf-8") as f:
-            json.dump(cls.config, f, indent=4)
+    def _write(cls, snapshots):
+        """Persist the given snapshots in a single transaction."""
+        with db.atomic():
+            for key, new in snapshots.items():
+                old = cls.persisted.get(key)
+                table = TABLES.get(key)
+                if table is not None:
+                    table.write(old or {}, new)
+                elif new is None:
+                    Setting.delete().where(Setting.key == key).execute()
+                elif new != old:
+                    Setting.replace(key=key, value=new).execute()
+        cls.persisted.update(snapshots)
@@ -0,0 +1,321 @@
+import operator
+from functools import reduce
+
+from peewee import (
+    AutoField,
+    BigIntegerField,
+    BooleanField,
+    CharField,
+    IntegerField,
+    Model,
+    SqliteDatabase,
+    TextField,
+)
+from playhouse.migrate import SqliteMigrator
+from playhouse.sqlite_ext import FTS5Model, RowIDField, SearchField
+
+from utils.dates import migrate_reminders
+
+# ==========================================================
+# Set up the SQLite database
+# ==========================================================
+
+# WAL lets the writer thread commit while the event loop keeps reading
+db = SqliteDatabase(
+    "db/sqlite3.db",
+    pragmas={
+        "journal_mode": "wal",
+        "synchronous": "normal",
+        "cache_size": -8 * 1024,  # 8 MB
+    },
+)
+
+
+# Base model for Peewee ORM
+# This will be the base class for all models in the application
+class BaseModel(Model):
+    class Meta:
+        database = db
+
+
+# ==========================================================
+# Configuration models
+# ==========================================================
+
+
+class Setting(BaseModel):
+    """Scalar configuration values, one JSON encoded row per key."""
+
+    key = CharField(primary_key=True)
+    value = TextField()
+
+
+class Reminder(BaseModel):
+    course = CharField()
+    name = CharField()
+    # UTC epoch seconds, and the zone the date was entered in
+    timestamp = IntegerField(index=True)
+    timezone = CharField(default="UTC")
+    description = TextField(default="")
+    modality = TextField(default="")
+    course_position = IntegerField()
+    position = IntegerField()
+
+    class Meta:
+        indexes = ((("course", "name"), True),)
+
+
+class Todo(BaseModel):
+    position = IntegerField(primary_key=True)
+    task = TextField()
+    completed = BooleanField(default=False)
+
+
+class Tool(BaseModel):
+    category = CharField()
+    position = IntegerField()
+    tool = TextField(null=True)
+    description = TextField(default="")
+    category_position = IntegerField()
+
+    class Meta:
+        indexes = ((("category", "position"), True),)
+
+
+class SyncedEvent(BaseModel):
+    google_event_id = CharField(primary_key=True)
+    discord_event_id = CharField(index=True)
+    date = CharField(null=True)
+    title = TextField(null=True)
+    channel = IntegerField(null=True)
+    notes = TextField(default="")
+    # Hash of the event content last sent to Discord
+    content_hash = CharField(null=True)
+
+
+# ==========================================================
+# News models
+# ==========================================================
+
+
+class Feed(BaseModel):
+    url = CharField(primary_key=True)
+    name = CharField()
+    color = IntegerField(default=0)
+    # Channel the entries are posted to, the news channel if not set
+    channel = IntegerField(null=True)
+    # Bounds (in seconds) of the delay between two polls, the defaults if not set
+    min_interval = IntegerField(null=True)
+    max_interval = IntegerField(null=True)
+
+
+class SentEntry(BaseModel):
+    """News entries already posted, stored as a 64 bit hash of their ID."""
+
+    digest = BigIntegerField(primary_key=True)
+    feed = CharField(index=True)
+    # UTC epoch seconds at which the entry was posted
+    timestamp = IntegerField()
+
+
+class Article(BaseModel):
+    """News entries kept for /news search, whatever their retention as sent entries."""
+
+    # Same hash of the entry ID as `SentEntry`
+    digest = BigIntegerField(unique=True)
+    feed = CharField()
+    source = CharField(index=True)
+    title = TextField()
+    text = TextField()
+    link = TextField()
+    # UTC epoch seconds of publication
+    published = IntegerField(index=True)
+
+
+class ArticleIndex(FTS5Model):
+    """Full-text index of the articles, its rowid being the `Article` ID."""
+
+    rowid = RowIDField()
+    title = SearchField()
+    text = SearchField()
+
+    class Meta:
+        database = db
+        # Accents are ignored, "securite" finds "sécurité"
+        options = {"tokenize": "unicode61 remove_diacritics 2"}
+
+
+# ==========================================================
+# Mapping between list shaped configuration values and tables
+# ==========================================================
+
+
+class Table:
+    """
+    Maps a list shaped configuration value onto the rows of `model`.
+
+    Rows are identified by the `key` columns, so a write only touches the rows whose
+    content differs from what was last persisted.
+    """
+
+    model = None
+    key = ()
+    order_by = ()
+
+    def flatten(self, value):
+        """Turn the configuration value into a list of row dictionaries."""
+        return list(value)
+
+    def build(self, rows):
+        """Turn the stored rows back into the configuration value."""
+        return rows
+
+    @property
+    def fields(self):
+        # Surrogate ids are left to SQLite, rows are matched on `key`
+        return [f for f in self.model._meta.sorted_fields if not isinstance(f, AutoField)]
+
+    def snapshot(self, value):
+        """Index the rows of `value` by key, comparing rows as plain tuples."""
+        defaults = [(field.name, field.default) for field in self.fields]
+        return {
+            tuple(row[k] for k in self.key): tuple(row.get(c, d) for c, d in defaults)
+            for row in self.flatten(value)
+        }
+
+    def read(self):
+        query = self.model.select().order_by(*self.order_by).dicts()
+        rows = list(query)
+        return self.build(rows) if rows else None
+
+    def write(self, old, new):
+        """Persist the difference between the `old` and `new` snapshots."""
+        key_fields = [self.model._meta.fields[k] for k in self.key]
+
+        for key in old.keys() - new.keys():
+            conditions = [field == value for field, value in zip(key_fields, key, strict=True)]
+            self.model.delete().where(reduce(operator.and_, conditions)).execute()
+
+        changed = [row for key, row in new.items() if old.get(key) != row]
+        for start in range(0, len(changed), 100):
+            batch = changed[start : start + 100]
+            self.model.insert_many(batch, fields=self.fields).on_conflict_replace().execute()
+
+
+class ReminderTable(Table):
+    model = Reminder
+    key = ("course", "name")
+    order_by = (Reminder.course_position, Reminder.position)
+
+    def flatten(self, value):
+        return [
+            {"course": reminder["name"], "course_position": i, "position": j, **field}
+            for i, reminder in enumerate(value)
+            for j, field in enumerate(reminder["fields"])
+        ]
+
+    def build(self, rows):
+        reminders = {}
+        for row in rows:
+            course = reminders.setdefault(row["course"], {"name": row["course"], "fields": []})
+            course["fields"].append(
+                {
+                    "name": row["name"],
+                    "timestamp": row["timestamp"],
+                    "timezone": row["timezone"],
+                    "description": row["description"],
+                    "modality": row["modality"],
+                }
+            )
+        return list(reminders.values())
+
+
+class TodoTable(Table):
+    model = Todo
+    key = ("position",)
+    order_by = (Todo.position,)
+
+    def flatten(self, value):
+        return [{"position": i, **todo} for i, todo in enumerate(value)]
+
+    def build(self, rows):
+        return [{"task": row["task"], "completed": row["completed"]} for row in rows]
+
+
+class ToolTable(Table):
+    model = Tool
+    key = ("category", "position")
+    order_by = (Tool.category_position, Tool.position)
+
+    def flatten(self, value):
+        return [
+            {"category": tools["category"], "category_position": i, "position": j, **field}
+            for i, tools in enumerate(value)
+            for j, field in enumerate(tools["fields"])
+        ]
+
+    def build(self, rows):
+        tools = {}
+        for row in rows:
+            category = tools.setdefault(
+                row["category"], {"category": row["category"], "fields": []}
+            )
+            category["fields"].append({"tool": row["tool"], "description": row["description"]})
+        return list(tools.values())
+
+
+class SyncedEventTable(Table):
+    model = SyncedEvent
+    key = ("google_event_id",)
+
+    def flatten(self, value):
+        return value["events"]
+
+    def build(self, rows):
+        return {"events": rows}
+
+
+class FeedTable(Table):
+    model = Feed
+    key = ("url",)
+    order_by = (Feed.name,)
+
+
+# Configuration keys backed by a dedicated table, every other key is a `Setting` row
+TABLES = {
+    "reminders": ReminderTable(),
+    "todos": TodoTable(),
+    "tools": ToolTable(),
+    "synced_events": SyncedEventTable(),
+    "news_feeds": FeedTable(),
+}
+
+MODELS = [Setting, Reminder, Todo, Tool, SyncedEvent, Feed, SentEntry, Article, ArticleIndex]
+
+
+def migrate(zone):
+    """Bring tables created by older versions up to date, `zone` being the reminder zone."""
+    if "date" in {column.name for column in db.get_columns(Reminder._meta.table_name)}:
+        # Naive date strings become epoch seconds, the table is rebuilt with the new schema
+        cursor = db.execute_sql(
+            "SELECT course, name, date, description, modality FROM reminder "
+            "ORDER BY course_position, position"
+        )
+        reminders = {}
+        for course, name, date, description, modality in cursor.fetchall():
+            reminders.setdefault(course, {"name": course, "fields": []})["fields"].append(
+                {"name": name, "date": date, "description": description, "modality": modality}
+            )
+        reminders = list(reminders.values())
+        migrate_reminders(reminders, zone)
+
+        table = TABLES["reminders"]
+        with db.atomic():
+            db.drop_tables([Reminder])
+            db.create_tables([Reminder])
+            table.write({}, table.snapshot(reminders))
+
+    table_name = SyncedEvent._meta.table_name
+    if "content_hash" not in {column.name for column in db.get_columns(table_name)}:
+        # Events synced before are sent to Discord once more, then hashed
+        SqliteMigrator(db).add_column(table_name, "content_hash", SyncedEvent.content_hash).run()
@@ -1,17 +1,27 @@
-import json
 import logging
 import os
 import platform
 import sys
 
 import discord
-import requests
 from discord.ext import commands
 from discord.ext.commands import Context
 from loguru import logger
-from peewee import Model, SqliteDatabase
 
-from config import DISCORD_BOT_TOKEN, ConfigManager
+from config import (
+    DISCORD_BOT_TOKEN,
+    HTTP_CONNECTIONS,
+    HTTP_CONNECTIONS_PER_HOST,
+    HTTP_MAX_SIZE,
+    HTTP_RETRIES,
+    HTTP_TIMEOUT,
+    ConfigManager,
+)
+from database import db
+from utils.boards import BoardRegistry
+from utils.http import HttpClient
+from utils.quotes import QuotePool
+from utils.render import BoardRenderer
 
 # ==========================================================
 # Set up logging
@@ -52,33 +62,6 @@ logger.add(
     enqueue=True,
 )
 
-# ==========================================================
-# Set up the SQLite database
-# ==========================================================
-
-db = SqliteDatabase("db/sqlite3.db")
-
-
-# Base model for Peewee ORM
-# This will be the base class for all models in the application
-class BaseModel(Model):
-    class Meta:
-        database = db
-
-
-# ==========================================================
-# ==== Command to get a random quote from ZenQuotes API ====
-# ==========================================================
-
-
-@logger.catch
-def get_quote():
-    response = requests.get("https://zenquotes.io/api/random", timeout=5)
-    json_data = json.loads(response.text)
-    quote = json_data[0]["q"] + " - " + json_data[0]["a"]
-    return quote
-
-
 # ========================================================
 # Discord bot class and event handlers
 # ========================================================
@@ -97,13 +80,22 @@ class DiscordBot(commands.Bot):
             help_command=None,
         )
 
+        # Cache of the board messages edited by the cogs
+        self.boards = BoardRegistry(self)
+        self.renderer = BoardRenderer(self.boards)
+        # Outbound HTTP of every cog, `http` being discord.py's own client
+        self.http_client = HttpClient(
+            HTTP_CONNECTIONS, HTTP_CONNECTIONS_PER_HOST, HTTP_TIMEOUT, HTTP_RETRIES, HTTP_MAX_SIZE
+        )
+        # Random quotes of ZenQuotes for $quote, fetched ahead of time
+        self.quotes = QuotePool(self.http_client)
+
     async def on_message(self, message: discord.Message) -> None:
         if message.author == self.user or message.author.bot:
             return
 
         if message.content.startswith("$quote"):
-            quote = get_quote()
-            await message.channel.send(quote)
+            await message.channel.send(self.quotes.take())
         else:
             await self.process_commands(message)
 
@@ -120,6 +112,9 @@ class DiscordBot(commands.Bot):
         logger.info(f"Running on: {platform.system()} {platform.release()} ({os.name})")
         logger.info(f"Database connected: {db.is_closed() is False}")
 
+        await self.http_client.start()
+        self.quotes.refill()
+
         # Load all cogs from the cogs directory
         logger.info("Loading cogs...")
         for filename in os.listdir("cogs"):
@@ -127,9 +122,12 @@ class DiscordBot(commands.Bot):
                 await self.load_extension(f"cogs.{filename[:-3]}")
                 logger.info(f"Loaded cog: {filename[:-3]}")
 
-        # Initialize the database
-        db.connect()
-        # db.create_tables([BaseModel], safe=True)
+    async def close(self) -> None:
+        # Persist pending configuration changes before the loop goes away
+        await ConfigManager.flush_async()
+        await super().close()
+        await self.quotes.close()
+        await self.http_client.close()
 
     async def on_command_completion(self, context: Context) -> None:
         """
@@ -232,8 +230,8 @@ def main():
     bot = DiscordBot()
     bot.run(DISCORD_BOT_TOKEN, log_handler=None)
 
-    # Save the configuration before exiting
-    ConfigManager.save()
+    # Save any configuration change still pending before exiting
+    ConfigManager.flush()
     logger.info("Discord bot has been stopped.")
 
 
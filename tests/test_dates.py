@@ -0,0 +1,33 @@
+from datetime import datetime
+
+import pytest
+
+from utils.dates import parse_date
+
+
+@pytest.mark.parametrize(
+    ("text", "expected"),
+    [
+        ("dans 2h", datetime(2025, 3, 12, 17, 30)),
+        ("in 2h", datetime(2025, 3, 12, 17, 30)),
+        ("in 3 hrs", datetime(2025, 3, 12, 18, 30)),
+        ("30 min", datetime(2025, 3, 12, 16, 0)),
+        ("45 s", datetime(2025, 3, 12, 15, 30, 45)),
+        ("dans 2 heures", datetime(2025, 3, 12, 17, 30)),
+    ],
+)
+def test_relative_time_from_afternoon(text, expected):
+    assert parse_date(text, datetime(2025, 3, 12, 15, 30)) == expected
+
+
+def test_relative_time_not_cached():
+    assert parse_date("dans 2h", datetime(2025, 3, 12, 9, 0)) == datetime(2025, 3, 12, 11, 0)
+    assert parse_date("dans 2h", datetime(2025, 3, 12, 15, 30)) == datetime(2025, 3, 12, 17, 30)
+
+
+def test_relative_time_past_midnight():
+    assert parse_date("dans 2h", datetime(2025, 3, 12, 22, 0)) == datetime(2025, 3, 13, 0, 0)
+
+
+def test_date_without_time_ends_the_day():
+    assert parse_date("15 mars", datetime(2025, 3, 12, 15, 30)) == datetime(2025, 3, 15, 23, 59)
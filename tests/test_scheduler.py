@@ -0,0 +1,48 @@
+import asyncio
+import time
+
+from utils import scheduler
+from utils.scheduler import TimerHeap
+
+
+def test_failed_callback_is_retried(monkeypatch):
+    monkeypatch.setattr(scheduler, "RETRY_DELAY", 0.01)
+    calls = []
+
+    async def callback(key, payload):
+        calls.append((key, payload))
+        if len(calls) < 3:
+            raise RuntimeError("transient")
+
+    async def run():
+        timers = TimerHeap(callback)
+        timers.schedule("event", time.time(), "payload")
+        timers.start()
+        await asyncio.sleep(0.2)
+        timers.stop()
+        return timers
+
+    timers = asyncio.run(run())
+    assert calls == [("event", "payload")] * 3
+    assert "event" not in timers
+
+
+def test_cancel_stops_retries(monkeypatch):
+    monkeypatch.setattr(scheduler, "RETRY_DELAY", 0.05)
+    calls = []
+
+    async def callback(key, payload):
+        calls.append(key)
+        raise RuntimeError("transient")
+
+    async def run():
+        timers = TimerHeap(callback)
+        timers.schedule("event", time.time())
+        timers.start()
+        await asyncio.sleep(0.02)
+        timers.cancel("event")
+        await asyncio.sleep(0.1)
+        timers.stop()
+
+    asyncio.run(run())
+    assert calls == ["event"]
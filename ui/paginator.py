@@ -0,0 +1,30 @@
+import discord
+
+
+class Paginator(discord.ui.View):
+    """Previous / next buttons browsing `pages` pages rendered by `render(page)`."""
+
+    def __init__(self, render, pages, timeout=300):
+        super().__init__(timeout=timeout)
+        self.render = render
+        self.pages = pages
+        self.page = 0
+        self.update_buttons()
+
+    def update_buttons(self):
+        self.previous.disabled = self.page <= 0
+        self.next.disabled = self.page >= self.pages - 1
+
+    async def show(self, interaction: discord.Interaction, page):
+        self.page = page
+        self.update_buttons()
+        embed = await self.render(page)
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def previous(self, interaction: discord.Interaction, _: discord.ui.Button):
+        await self.show(interaction, self.page - 1)
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next(self, interaction: discord.Interaction, _: discord.ui.Button):
+        await self.show(interaction, self.page + 1)
@@ -0,0 +1,96 @@
+import asyncio
+import re
+
+from peewee import JOIN, fn
+
+from database import Article, ArticleIndex, db
+from utils.dedupe import digest
+
+# Rows written per statement, below SQLite's variable limit
+BATCH_SIZE = 100
+# Weights of the title and the text in the ranking of the results
+WEIGHTS = (10.0, 1.0)
+
+WORD = re.compile(r"\w+")
+
+
+class Archive:
+    """
+    Full-text searchable archive of the news entries, in SQLite FTS5.
+
+    Entries are indexed as they are polled, a few at a time, and queries only read the
+    index, so searches stay fast as the archive grows. Database work runs in a thread.
+    """
+
+    async def add(self, articles):
+        """Archive `articles`, dicts of `Article` fields with the entry `id`."""
+        if articles:
+            await asyncio.to_thread(self._write, articles)
+
+    @staticmethod
+    def _write(articles):
+        rows = [
+            {
+                "digest": digest(article["id"]),
+                **{key: value for key, value in article.items() if key != "id"},
+            }
+            for article in articles
+        ]
+        with db.atomic():
+            for i in range(0, len(rows), BATCH_SIZE):
+                batch = rows[i : i + BATCH_SIZE]
+                Article.insert_many(batch).on_conflict_ignore().execute()
+
+                # Only the articles that were not archived yet get indexed
+                query = (
+                    Article.select(Article.id, Article.title, Article.text)
+                    .join(
+                        ArticleIndex,
+                        on=(ArticleIndex.rowid == Article.id),
+                        join_type=JOIN.LEFT_OUTER,
+                    )
+                    .where(
+                        Article.digest.in_([row["digest"] for row in batch]),
+                        ArticleIndex.rowid.is_null(),
+                    )
+                    .tuples()
+                )
+                ArticleIndex.insert_many(
+                    list(query), fields=[ArticleIndex.rowid, ArticleIndex.title, ArticleIndex.text]
+                ).execute()
+
+    async def search(self, query, source=None, since=None, limit=5, offset=0):
+        """
+        Return the number of articles matching `query`, and the best `limit` of them
+        from `offset`, with a snippet of their text highlighting the matches.
+        """
+        return await asyncio.to_thread(self._search, query, source, since, limit, offset)
+
+    @staticmethod
+    def _search(query, source, since, limit, offset):
+        # Every word must match, quoted so user input can't break the FTS5 syntax
+        words = WORD.findall(query)
+        if not words:
+            return 0, []
+        conditions = [ArticleIndex.match(" ".join(f'"{word}"' for word in words))]
+        if source is not None:
+            conditions.append(fn.lower(Article.source) == source.lower())
+        if since is not None:
+            conditions.append(Article.published >= since)
+
+        base = Article.select().join(ArticleIndex, on=(ArticleIndex.rowid == Article.id))
+        total = base.where(*conditions).count()
+
+        table = ArticleIndex._meta.entity
+        results = (
+            Article.select(
+                Article,
+                fn.snippet(table, 1, "**", "**", "…", 24).alias("snippet"),
+            )
+            .join(ArticleIndex, on=(ArticleIndex.rowid == Article.id))
+            .where(*conditions)
+            .order_by(fn.bm25(table, *WEIGHTS))
+            .limit(limit)
+            .offset(offset)
+        )
+        return total, list(results)
@@ -0,0 +1,161 @@
+import heapq
+import itertools
+import unicodedata
+from bisect import bisect_left, insort
+
+from discord import app_commands
+
+# Discord rejects autocomplete responses with more than 25 choices
+MAX_CHOICES = 25
+# Choice names and values are limited to 100 characters
+MAX_CHOICE_LENGTH = 100
+
+
+def normalize(text):
+    """Case and accent folded form of `text` used for matching."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def ngrams(text):
+    """All the 1, 2 and 3 character substrings of `text`."""
+    return {text[i : i + n] for n in (1, 2, 3) for i in range(len(text) - n + 1)}
+
+
+def to_choices(values):
+    return [
+        app_commands.Choice(name=value[:MAX_CHOICE_LENGTH], value=value[:MAX_CHOICE_LENGTH])
+        for value in values
+    ]
+
+
+class AutocompleteIndex:
+    """
+    Incremental index of labels answering autocomplete queries.
+
+    Lookups use sorted lists (prefix and word starts) and an n-gram index (substrings)
+    instead of scanning every label. Matches are ranked prefix > word start > substring,
+    then most recently added or touched first, and capped to what Discord accepts.
+    """
+
+    def __init__(self, labels=()):
+        self._clock = itertools.count()
+        self.clear()
+        for label in labels:
+            self._insert(label, keep_sorted=False)
+        self._prefixes.sort()
+        self._words.sort()
+
+    def __len__(self):
+        return len(self._stamps)
+
+    def __contains__(self, label):
+        return label in self._stamps
+
+    def add(self, label):
+        """Add `label`, or mark it as recently used if already indexed."""
+        if label in self._stamps:
+            # Re-inserting keeps the dictionary ordered from least to most recent
+            del self._stamps[label]
+            self._stamps[label] = next(self._clock)
+            return
+        self._insert(label)
+
+    def _insert(self, label, keep_sorted=True):
+        key = normalize(label)
+        self._keys[label] = key
+        self._stamps[label] = next(self._clock)
+        add = insort if keep_sorted else list.append
+        add(self._prefixes, (key, label))
+        for word in key.split()[1:]:
+            add(self._words, (word, label))
+        for gram in ngrams(key):
+            self._grams.setdefault(gram, set()).add(label)
+
+    def remove(self, label):
+        if label not in self._stamps:
+            return
+
+        key = self._keys.pop(label)
+        del self._stamps[label]
+        self._discard(self._prefixes, (key, label))
+        for word in key.split()[1:]:
+            self._discard(self._words, (word, label))
+        for gram in ngrams(key):
+            labels = self._grams[gram]
+            labels.discard(label)
+            if not labels:
+                del self._grams[gram]
+
+    def clear(self):
+        # label -> normalized label
+        self._keys = {}
+        # label -> recency stamp, ordered from least to most recently used
+        self._stamps = {}
+        # Sorted (normalized label, label) and (word, label) pairs for prefix lookups
+        self._prefixes = []
+        self._words = []
+        # n-gram -> labels containing it
+        self._grams = {}
+
+    @staticmethod
+    def _discard(items, item):
+        index = bisect_left(items, item)
+        if index < len(items) and items[index] == item:
+            del items[index]
+
+    @staticmethod
+    def _starting_with(items, query):
+        # Every key starting with `query` sorts between `query` and `query` + max char
+        start = bisect_left(items, (query,))
+        end = bisect_left(items, (query + "\U0010ffff",), start)
+        for i in range(start, end):
+            yield items[i][1]
+
+    def _containing(self, query):
+        if len(query) <= 3:
+            yield from self._grams.get(query, ())
+            return
+        # Candidates share every trigram of the query, then are checked for real
+        grams = sorted((self._grams.get(g, set()) for g in ngrams(query) if len(g) == 3), key=len)
+        candidates = set.intersection(*grams) if grams else set()
+        for label in candidates:
+            if query in self._keys[label]:
+                yield label
+
+    def search(self, query, limit=MAX_CHOICES, where=None):
+        """Return up to `limit` labels matching `query`, best first."""
+        query = normalize(query.strip())
+        if not query:
+            recent = reversed(self._stamps)
+            if where is not None:
+                recent = filter(where, recent)
+            return list(itertools.islice(recent, limit))
+
+        results = []
+        seen = set()
+
+        def unseen(labels):
+            for label in labels:
+                if label not in seen:
+                    seen.add(label)
+                    yield label
+
+        # Lookups are generators, a rank is only looked up when the better ones did not
+        # fill `limit`
+        for labels in (
+            self._starting_with(self._prefixes, query),
+            self._starting_with(self._words, query),
+            self._containing(query),
+        ):
+            labels = unseen(labels)
+            if where is not None:
+                labels = filter(where, labels)
+            # Within a rank, the most recently used labels come first
+            results += heapq.nlargest(limit - len(results), labels, key=self._stamps.__getitem__)
+            if len(results) >= limit:
+                break
+        return results
+
+    def choices(self, query, where=None):
+        return to_choices(self.search(query, where=where))
@@ -0,0 +1,63 @@
+from discord import HTTPException
+
+
+class BoardRegistry:
+    """
+    In-memory cache of the persistent "board" messages the cogs keep editing
+    (calendar, todos, tools).
+
+    A board is only fetched on a cache miss, so a command pays a single REST call for
+    its edit. Entries follow the gateway: edits refresh them and deletions drop them.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._messages = {}
+
+        bot.add_listener(self.on_raw_message_edit)
+        bot.add_listener(self.on_raw_message_delete)
+        bot.add_listener(self.on_raw_bulk_message_delete)
+
+    def __contains__(self, message_id):
+        return message_id in self._messages
+
+    async def fetch(self, channel, message_id):
+        """Return the board message, fetching it only if it is not cached."""
+        message = self._messages.get(message_id)
+        if message is None:
+            message = await channel.fetch_message(message_id)
+            self._messages[message.id] = message
+        return message
+
+    async def send(self, channel, **kwargs):
+        message = await channel.send(**kwargs)
+        self._messages[message.id] = message
+        return message
+
+    async def edit(self, message, **kwargs):
+        try:
+            message = await message.edit(**kwargs)
+        except HTTPException:
+            # The cached copy may have been modified in place, it can't be trusted anymore
+            self.invalidate(message.id)
+            raise
+        self._messages[message.id] = message
+        return message
+
+    async def delete(self, message):
+        self.invalidate(message.id)
+        await message.delete()
+
+    def invalidate(self, message_id):
+        self._messages.pop(message_id, None)
+
+    async def on_raw_message_edit(self, payload):
+        if payload.message_id in self._messages:
+            self._messages[payload.message_id] = payload.message
+
+    async def on_raw_message_delete(self, payload):
+        self.invalidate(payload.message_id)
+
+    async def on_raw_bulk_message_delete(self, payload):
+        for message_id in payload.message_ids:
+            self.invalidate(message_id)
@@ -0,0 +1,234 @@
+import re
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import dateparser
+
+# Format of the naive dates stored by older versions of the reminders
+LEGACY_DATE_FORMAT = "%Y-%m-%d %H:%M"
+
+
+def get_zone(name, default="UTC"):
+    """Return the time zone called `name`, or `default` if it is unknown."""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError, TypeError):
+        return ZoneInfo(default)
+
+
+def to_timestamp(date, zone):
+    """Convert a naive datetime, expressed in `zone`, to UTC epoch seconds."""
+    return int(date.replace(tzinfo=zone).timestamp())
+
+
+def migrate_reminders(reminders, zone):
+    """
+    Convert, in place, reminder events still holding a naive `date` string to epoch
+    seconds, interpreting the date in `zone`. Events named like an earlier event of
+    their course, which older versions accepted, are renamed as events are stored by
+    course and name. Returns whether anything changed.
+    """
+    changed = False
+    for reminder in reminders:
+        names = set()
+        for event in reminder["fields"]:
+            name, count = event["name"], 1
+            while name in names:
+                count += 1
+                name = f"{event['name']} ({count})"
+            if name != event["name"]:
+                event["name"] = name
+                changed = True
+            names.add(name)
+            if "date" in event:
+                naive = datetime.strptime(event.pop("date"), LEGACY_DATE_FORMAT)
+                event["timestamp"] = to_timestamp(naive, zone)
+                event["timezone"] = zone.key
+                changed = True
+    return changed
+
+
+# ==========================================================
+# Date parsing for /reminder
+# ==========================================================
+
+# Time used when a date is given without one, the end of the day for a deadline
+DEFAULT_TIME = (23, 59)
+
+DATEPARSER_SETTINGS = {
+    "RETURN_AS_TIMEZONE_AWARE": False,
+    "PREFER_DATES_FROM": "future",
+    "PREFER_DAY_OF_MONTH": "first",
+    "PREFER_LOCALE_DATE_ORDER": True,
+    "PREFER_MONTH_OF_YEAR": "current",
+}
+
+WEEKDAYS = {
+    "lundi": 0,
+    "mardi": 1,
+    "mercredi": 2,
+    "jeudi": 3,
+    "vendredi": 4,
+    "samedi": 5,
+    "dimanche": 6,
+    "monday": 0,
+    "tuesday": 1,
+    "wednesday": 2,
+    "thursday": 3,
+    "friday": 4,
+    "saturday": 5,
+    "sunday": 6,
+}
+
+RELATIVE_DAYS = {
+    "aujourd'hui": 0,
+    "aujourdhui": 0,
+    "today": 0,
+    "demain": 1,
+    "tomorrow": 1,
+    "après-demain": 2,
+    "apres-demain": 2,
+}
+
+# Optional time suffix: "14:30", "14h", "14h30", "à 14h", "at 2pm", "2:30 pm"
+_TIME = (
+    r"(?:\s*,?\s*(?:à|a|at)?\s*(?P<hour>\d{1,2})"
+    r"(?:(?:[h:](?P<minute>\d{2})?)?\s*(?P<meridiem>am|pm)|[h:](?P<minutes>\d{2})?))?$"
+)
+
+_DATE_PATTERNS = [
+    # 24/12/2025, 24/12/25, 24/12, 24.12.2025
+    (
+        "numeric",
+        re.compile(
+            r"^(?P<day>\d{1,2})[/.-](?P<month>\d{1,2})(?:[/.-](?P<year>\d{4}|\d{2}))?" + _TIME
+        ),
+    ),
+    # 2025-12-24
+    ("iso", re.compile(r"^(?P<year>\d{4})-(?P<month>\d{1,2})-(?P<day>\d{1,2})(?:t|\s)?" + _TIME)),
+    # demain, tomorrow 14h
+    ("relative", re.compile(r"^(?P<word>" + "|".join(RELATIVE_DAYS) + r")" + _TIME)),
+    # vendredi, lundi prochain, next monday
+    (
+        "weekday",
+        re.compile(
+            r"^(?:(?:next|this|ce)\s+)?(?P<weekday>"
+            + "|".join(WEEKDAYS)
+            + r")(?:\s+prochain)?"
+            + _TIME
+        ),
+    ),
+    # dans 3 jours, in 2 weeks
+    (
+        "offset",
+        re.compile(
+            r"^(?:dans|in)\s+(?P<count>\d+)\s*(?P<unit>jours?|days?|semaines?|weeks?)" + _TIME
+        ),
+    ),
+]
+
+# Relative expressions below one day ("dans 2h", "in 3 hrs", "30 min") are not cached and
+# parsed against the current time, their answer changes within the day
+_SUB_DAY = re.compile(
+    r"\b(?:heures?|hours?|minutes?|mins?|secondes?|seconds?)\b"
+    r"|^(?:dans|in)?\s*\d+\s*(?:h|hrs?|mn|mins?|s|secs?)(?![a-z])"
+)
+
+
+def _parse_time(match):
+    if match["hour"] is None:
+        return DEFAULT_TIME
+    hour = int(match["hour"])
+    minute = int(match["minute"] or match["minutes"] or 0)
+    if match["meridiem"] == "pm" and hour < 12:
+        hour += 12
+    elif match["meridiem"] == "am" and hour == 12:
+        hour = 0
+    return hour, minute
+
+
+def _fast_parse(text, now):
+    """Parse the common French and English forms with precompiled patterns."""
+    for kind, pattern in _DATE_PATTERNS:
+        match = pattern.match(text)
+        if match is None:
+            continue
+
+        hour, minute = _parse_time(match)
+        today = now.date()
+        match kind:
+            case "numeric" | "iso":
+                year = match["year"]
+                if year is None:
+                    day = date(today.year, int(match["month"]), int(match["day"]))
+                    # Without a year, prefer the next occurrence of the date
+                    if day < today:
+                        day = day.replace(year=today.year + 1)
+                else:
+                    year = int(year) + 2000 if len(year) == 2 else int(year)
+                    day = date(year, int(match["month"]), int(match["day"]))
+            case "relative":
+                day = today + timedelta(days=RELATIVE_DAYS[match["word"]])
+            case "weekday":
+                # Always in the future, the same weekday means next week
+                delta = (WEEKDAYS[match["weekday"]] - today.weekday() - 1) % 7 + 1
+                day = today + timedelta(days=delta)
+            case "offset":
+                count = int(match["count"])
+                unit = 7 if match["unit"][0] in "sw" else 1
+                day = today + timedelta(days=count * unit)
+
+        return datetime.combine(day, time(hour, minute))
+    return None
+
+
+@lru_cache(maxsize=512)
+def _cached_dateparser(text, reference):
+    return _dateparser(text, datetime.combine(reference, datetime.min.time()))
+
+
+def _dateparser(text, now, default_time=True):
+    result = dateparser.parse(
+        text,
+        languages=["fr", "en"],
+        settings={**DATEPARSER_SETTINGS, "RELATIVE_BASE": now},
+    )
+    if default_time and result is not None and result.hour == 0 and result.minute == 0:
+        result = result.replace(hour=DEFAULT_TIME[0], minute=DEFAULT_TIME[1])
+    return result
+
+
+def parse_date(text, now=None):
+    """
+    Parse a /reminder date as a naive datetime, relative to `now`.
+
+    Common forms are handled by precompiled patterns, anything else falls back to
+    `dateparser`. Its results are memoized per input and reference day, except for
+    times relative to now, which are parsed against `now` every time.
+    Raises `ValueError` if the date cannot be understood.
+    """
+    now = now or datetime.now()
+    text = " ".join(text.lower().split())
+
+    try:
+        result = _fast_parse(text, now)
+    except ValueError:
+        # Matched a pattern, but not a valid date (e.g. 31/02)
+        result = None
+    if result is None:
+        if _SUB_DAY.search(text):
+            # A time relative to now may well land on midnight
+            result = _dateparser(text, now, default_time=False)
+        else:
+            result = _cached_dateparser(text, now.date())
+
+    if result is None:
+        raise ValueError(f"Invalid date format: {text}")
+    return result
+
+
+def warm_up():
+    """Load the `dateparser` language data, which is otherwise done by the first parse."""
+    _dateparser("demain 14:00", datetime.now())
+    _dateparser("next friday 2pm", datetime.now())
@@ -0,0 +1,85 @@
+import asyncio
+import hashlib
+import time
+
+from database import SentEntry, db
+
+# Rows written or deleted per statement, below SQLite's variable limit
+BATCH_SIZE = 500
+
+
+def digest(entry_id):
+    """Signed 64 bit hash of an entry ID, as stored in the database."""
+    data = hashlib.blake2b(entry_id.encode(), digest_size=8).digest()
+    return int.from_bytes(data, "big", signed=True)
+
+
+class SentEntries:
+    """
+    Bounded set of the news entries already posted.
+
+    Entry IDs are kept as 64 bit hashes, in memory for O(1) lookups and in the
+    `SentEntry` table so they survive restarts. Each feed keeps at most `max_count`
+    entries, none older than `max_age` seconds, so the store stays the same size
+    however long the bot runs. Both bounds must cover more than a feed lists at once,
+    or entries still in the feed would be posted again.
+    """
+
+    def __init__(self, max_age, max_count):
+        self.max_age = max_age
+        self.max_count = max_count
+        # digest -> feed URL
+        self._feeds = {}
+        # feed URL -> {digest: timestamp}, oldest first
+        self._entries = {}
+
+    def __contains__(self, entry_id):
+        return digest(entry_id) in self._feeds
+
+    def __len__(self):
+        return len(self._feeds)
+
+    def load(self):
+        query = SentEntry.select().order_by(SentEntry.timestamp).tuples()
+        for key, feed, timestamp in query:
+            self._feeds[key] = feed
+            self._entries.setdefault(feed, {})[key] = timestamp
+
+    async def add(self, feed, entry_ids, now=None):
+        """Remember `entry_ids` as posted from `feed`, and forget the expired entries."""
+        now = int(now if now is not None else time.time())
+        entries = self._entries.setdefault(feed, {})
+        added = []
+        for entry_id in entry_ids:
+            key = digest(entry_id)
+            if key not in self._feeds:
+                self._feeds[key] = feed
+                entries[key] = now
+                added.append((key, feed, now))
+
+        # Entries are ordered by timestamp, the expired ones are at the front
+        expired = []
+        cutoff = now - self.max_age
+        for key, timestamp in entries.items():
+            if len(entries) - len(expired) <= self.max_count and timestamp >= cutoff:
+                break
+            expired.append(key)
+        for key in expired:
+            del entries[key]
+            del self._feeds[key]
+
+        if added or expired:
+            await asyncio.to_thread(self._write, added, expired)
+
+    @staticmethod
+    def _write(added, expired):
+        with db.atomic():
+            for i in range(0, len(added), BATCH_SIZE):
+                SentEntry.insert_many(
+                    added[i : i + BATCH_SIZE],
+                    fields=[SentEntry.digest, SentEntry.feed, SentEntry.timestamp],
+                ).on_conflict_ignore().execute()
+            for i in range(0, len(expired), BATCH_SIZE):
+                SentEntry.delete().where(
+                    SentEntry.digest.in_(expired[i : i + BATCH_SIZE])
+                ).execute()
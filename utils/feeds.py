@@ -0,0 +1,59 @@
+import calendar
+import html
+import re
+
+import feedparser
+
+from utils.similarity import minhash
+
+TAG = re.compile(r"<[^>]*>")
+SPACES = re.compile(r"[ \t\r\f\v]+")
+BLANK_LINES = re.compile(r"\n\s*\n+")
+
+# Longest text kept for an entry, embeds only show the first 1000 characters
+MAX_TEXT = 2000
+MAX_TITLE = 256
+
+
+def clean_html(raw_html):
+    """Plain text of an HTML fragment, tags removed and entities decoded."""
+    text = html.unescape(TAG.sub("", raw_html))
+    text = SPACES.sub(" ", text)
+    return BLANK_LINES.sub("\n\n", text).strip()
+
+
+def timestamp(entry):
+    """Publication time of an entry as a UTC epoch, if the feed provides one."""
+    published = entry.get("published_parsed") or entry.get("updated_parsed")
+    return calendar.timegm(published) if published else None
+
+
+def parse_feed(content, headers=None):
+    """
+    Parse a feed document into slim entry records, ready to be posted.
+
+    Meant to run in a worker process: only the small records, plain dicts of strings
+    and numbers with the MinHash signature of the entry, are sent back to the event loop.
+    """
+    feed = feedparser.parse(content, response_headers=headers or {})
+    records = []
+    for entry in feed.entries:
+        entry_id = entry.get("id") or entry.get("link") or entry.get("title")
+        if not entry_id:
+            continue
+        title = clean_html(entry.get("title", ""))[:MAX_TITLE]
+        text = clean_html(entry.get("description", ""))[:MAX_TEXT]
+        records.append(
+            {
+                "id": entry_id,
+                "title": title,
+                "text": text,
+                "link": entry.get("link", ""),
+                "published": timestamp(entry),
+                "author": entry.get("author"),
+                "categories": [tag.term for tag in entry.get("tags", []) if tag.get("term")],
+                # Hashing the words is costly too, it is done here rather than on delivery
+                "signature": minhash(f"{title} {text}"),
+            }
+        )
+    return records
@@ -0,0 +1,153 @@
+import asyncio
+import json
+import random
+import statistics
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+import aiohttp
+
+# Statuses worth retrying, the server may answer the next attempt
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Methods retried by default, sending them twice has the same effect as once
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+# First delay (in seconds) between two attempts, doubled on every retry
+RETRY_DELAY = 0.5
+# Longest delay waited before a retry, longer Retry-After are left to the caller
+MAX_RETRY_DELAY = 30
+# Time (in seconds) an idle connection is kept open for the next request to the host
+KEEPALIVE_TIMEOUT = 60
+# Latencies kept per host for the percentiles
+LATENCY_SAMPLES = 256
+
+
+class ResponseTooLarge(aiohttp.ClientPayloadError):
+    """The response body is larger than allowed."""
+
+
+class Response:
+    """Status, headers and body of a completed request."""
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def text(self, encoding="utf-8"):
+        return self.body.decode(encoding, errors="replace")
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class HostMetrics:
+    """Requests, errors and latency of the requests sent to a host."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def record(self, latency, error=False):
+        self.requests += 1
+        self.errors += error
+        self.latencies.append(latency)
+
+    def percentile(self, percent):
+        """Latency (in seconds) under which `percent` % of the latest requests finished."""
+        if len(self.latencies) < 2:
+            return self.latencies[0] if self.latencies else 0
+        return statistics.quantiles(self.latencies, n=100)[percent - 1]
+
+
+class HttpClient:
+    """
+    Asynchronous HTTP client shared by the whole bot.
+
+    Connections are pooled and kept alive between requests, with at most `per_host`
+    of them open to the same host. Requests time out after `timeout` seconds, failures
+    of idempotent requests are retried `retries` times with an exponential backoff, and
+    bodies larger than `max_size` bytes are refused. Latency and errors are recorded
+    per host in `metrics`.
+    """
+
+    def __init__(self, limit=100, per_host=8, timeout=20, retries=2, max_size=5 * 1024 * 1024):
+        self.limit = limit
+        self.per_host = per_host
+        self.timeout = timeout
+        self.retries = retries
+        self.max_size = max_size
+        self.session = None
+        # Metrics of every host requested, keyed by host name
+        self.metrics = {}
+
+    async def start(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.limit, limit_per_host=self.per_host, keepalive_timeout=KEEPALIVE_TIMEOUT
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout)
+        )
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def request(self, method, url, timeout=None, retries=None, max_size=None, **kwargs):
+        """
+        Send a request and read its response, raising `aiohttp.ClientResponseError` for
+        error statuses once the retries are exhausted. Other arguments are passed to
+        `aiohttp.ClientSession.request`.
+        """
+        if retries is None:
+            retries = self.retries if method in IDEMPOTENT_METHODS else 0
+        if timeout is not None:
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout)
+        max_size = max_size or self.max_size
+        metrics = self.metrics.setdefault(urlparse(url).hostname, HostMetrics())
+
+        for attempt in range(retries + 1):
+            start = time.perf_counter()
+            try:
+                response = await self._send(method, url, max_size, **kwargs)
+            except aiohttp.ClientResponseError as e:
+                metrics.record(time.perf_counter() - start, error=True)
+                if e.status not in RETRY_STATUSES or attempt == retries:
+                    raise
+                retry_after = e.headers.get("Retry-After", "") if e.headers else ""
+                delay = int(retry_after) if retry_after.isdigit() else self.backoff(attempt)
+                if delay > MAX_RETRY_DELAY:
+                    raise
+            except ResponseTooLarge:
+                metrics.record(time.perf_counter() - start, error=True)
+                raise
+            except (aiohttp.ClientError, TimeoutError):
+                metrics.record(time.perf_counter() - start, error=True)
+                if attempt == retries:
+                    raise
+                delay = self.backoff(attempt)
+            else:
+                metrics.record(time.perf_counter() - start)
+                return response
+            await asyncio.sleep(delay)
+
+    async def _send(self, method, url, max_size, **kwargs):
+        async with self.session.request(method, url, **kwargs) as response:
+            response.raise_for_status()
+            if (response.content_length or 0) > max_size:
+                raise ResponseTooLarge(f"Response larger than {max_size} bytes")
+            body = bytearray()
+            async for chunk in response.content.iter_chunked(64 * 1024):
+                body += chunk
+                if len(body) > max_size:
+                    raise ResponseTooLarge(f"Response larger than {max_size} bytes")
+            return Response(response.status, response.headers, bytes(body))
+
+    @staticmethod
+    def backoff(attempt):
+        """Delay before retrying after `attempt` failed, randomized to spread retries."""
+        return RETRY_DELAY * 2**attempt * random.uniform(0.5, 1)
@@ -0,0 +1,92 @@
+import asyncio
+import random
+import time
+from collections import deque
+
+import aiohttp
+from loguru import logger
+
+from config import ConfigManager
+
+# ZenQuotes endpoint answering with a batch of 50 random quotes
+QUOTES_URL = "https://zenquotes.io/api/quotes"
+# Quotes left in the pool below which a new batch is fetched
+LOW_WATER = 10
+# Quotes kept in the configuration, served when the pool is empty
+FALLBACK_SIZE = 500
+# First delay (in seconds) before fetching again after a failure, doubled on every failure
+RETRY_DELAY = 30
+MAX_RETRY_DELAY = 3600
+# Author of the quote ZenQuotes answers with once its rate limit is exceeded
+RATE_LIMIT_AUTHOR = "zenquotes.io"
+
+
+class QuotePool:
+    """
+    Quotes fetched from ZenQuotes ahead of time, so `$quote` never waits for the API.
+
+    Quotes are fetched in batches in the background whenever the pool runs low, backing
+    off while the API fails or rate limits the bot. The latest quotes are saved in the
+    configuration, and served when the pool is empty.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.pool = deque()
+        self.fallback = deque(ConfigManager.get("quotes", []), maxlen=FALLBACK_SIZE)
+        self.refill_task = None
+        self.failures = 0
+        self.retry_at = 0
+
+    def take(self):
+        """A quote, from the pool if possible."""
+        if len(self.pool) <= LOW_WATER:
+            self.refill()
+        if self.pool:
+            return self.pool.popleft()
+        if self.fallback:
+            return random.choice(self.fallback)
+        return "Aucune citation disponible pour le moment."
+
+    def refill(self):
+        """Fetch a batch of quotes in the background, unless already fetching or backing off."""
+        if self.refill_task is None and time.monotonic() >= self.retry_at:
+            self.refill_task = asyncio.create_task(self._refill())
+
+    async def close(self):
+        if self.refill_task is not None:
+            self.refill_task.cancel()
+
+    async def _refill(self):
+        try:
+            response = await self.client.get(QUOTES_URL, timeout=10, retries=0)
+            quotes = [f"{quote['q']} - {quote['a']}" for quote in response.json()]
+        except aiohttp.ClientResponseError as e:
+            retry_after = e.headers.get("Retry-After", "") if e.headers else ""
+            self.back_off(
+                f"{e.status} {e.message}", int(retry_after) if retry_after.isdigit() else 0
+            )
+            return
+        except (aiohttp.ClientError, TimeoutError, ValueError, KeyError, TypeError) as e:
+            self.back_off(repr(e))
+            return
+        finally:
+            self.refill_task = None
+
+        # Over the rate limit, ZenQuotes answers with a quote of its own
+        if any(quote.endswith(f" - {RATE_LIMIT_AUTHOR}") for quote in quotes):
+            self.back_off("rate limited")
+            return
+
+        self.failures = 0
+        self.pool.extend(quotes)
+        self.fallback.extend(quotes)
+        ConfigManager.set("quotes", list(self.fallback))
+
+    def back_off(self, error, retry_after=0):
+        """Wait longer after every consecutive failure, at least `retry_after` seconds."""
+        self.failures += 1
+        delay = min(RETRY_DELAY * 2 ** (self.failures - 1), MAX_RETRY_DELAY)
+        delay = max(delay, retry_after)
+        self.retry_at = time.monotonic() + delay
+        logger.warning(f"Failed to fetch quotes, next attempt in {delay:.0f} s: {error}")
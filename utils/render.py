@@ -0,0 +1,304 @@
+import asyncio
+import contextlib
+import hashlib
+import json
+from collections import deque
+
+from discord import Embed, NotFound
+from loguru import logger
+
+from config import ConfigManager
+
+# Discord limits, see https://discord.com/developers/docs/resources/message#embed-object-embed-limits
+EMBED_TITLE = 256
+EMBED_DESCRIPTION = 4096
+EMBED_FIELDS = 25
+FIELD_NAME = 256
+FIELD_VALUE = 1024
+MESSAGE_EMBEDS = 10
+MESSAGE_CHARACTERS = 6000
+
+# Name of the fields continuing a value too long for a single field
+CONTINUATION = "\u200b"
+
+# Delay (in seconds) during which edits of the same board are merged into one
+EDIT_DELAY = 1.0
+
+
+def split_value(value, limit=FIELD_VALUE):
+    """Split a field value on line boundaries into chunks of at most `limit` characters."""
+    chunks = []
+    current = ""
+    for line in value.split("\n"):
+        while len(line) > limit:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+        if current and len(current) + 1 + len(line) > limit:
+            chunks.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    if current or not chunks:
+        chunks.append(current)
+    return chunks
+
+
+def render(sections, footer=None, max_fields=EMBED_FIELDS):
+    """
+    Build embeds from `sections`, each a dict with an optional `title`, `description`
+    and `color`, and a list of `(name, value)` `fields`.
+
+    Every section starts a new embed, and continues in untitled embeds once it reaches
+    `max_fields` fields or the character budget of an embed. `footer` (a dict of
+    `Embed.set_footer` arguments) goes on the last embed.
+    """
+    embeds = []
+    for section in sections:
+        color = section.get("color")
+        embed = Embed(
+            title=(section.get("title") or "")[:EMBED_TITLE] or None,
+            description=(section.get("description") or "")[:EMBED_DESCRIPTION] or None,
+            color=color,
+        )
+        embeds.append(embed)
+
+        for name, value in section.get("fields", []):
+            for i, chunk in enumerate(split_value(value or CONTINUATION)):
+                field_name = (name if i == 0 else CONTINUATION)[:FIELD_NAME]
+                size = len(field_name) + len(chunk)
+                if len(embed.fields) >= max_fields or len(embed) + size > MESSAGE_CHARACTERS:
+                    embed = Embed(color=color)
+                    embeds.append(embed)
+                embed.add_field(name=field_name, value=chunk, inline=False)
+
+    if footer and embeds:
+        embeds[-1].set_footer(**footer)
+    return embeds
+
+
+def paginate(embeds):
+    """Group embeds into messages of at most 10 embeds and 6000 characters."""
+    pages = []
+    size = 0
+    for embed in embeds:
+        if not pages or len(pages[-1]) >= MESSAGE_EMBEDS or size + len(embed) > MESSAGE_CHARACTERS:
+            pages.append([])
+            size = 0
+        pages[-1].append(embed)
+        size += len(embed)
+    return pages
+
+
+def payload_hash(embeds):
+    data = json.dumps([embed.to_dict() for embed in embeds], sort_keys=True)
+    return hashlib.blake2b(data.encode(), digest_size=16).hexdigest()
+
+
+def fits(embeds):
+    """Whether `embeds` fit in a single message."""
+    return len(paginate(embeds)) <= 1
+
+
+class BoardRenderer:
+    """
+    Keeps board messages in sync with the data they display.
+
+    Cogs call `update` with a function rendering the board from their data. Updates
+    of the same board within `EDIT_DELAY` are merged into a single edit, rendered from
+    the latest data, and the edit is skipped if the rendered payload did not change.
+
+    Boards too large for one message are sharded with `update_sections`: each section
+    (e.g. a course) is assigned to a message and stays there, so a change only edits the
+    message holding the sections that changed. A section too large for one message
+    spans several consecutive messages.
+    """
+
+    def __init__(self, boards, delay=EDIT_DELAY):
+        self.boards = boards
+        self.delay = delay
+        # message ID -> hash of the embeds it shows
+        self._hashes = {}
+        # key -> (channel, build, changed sections, or None for single message boards)
+        self._pending = {}
+        self._tasks = {}
+
+    def update(self, key, channel, build):
+        """
+        Schedule a render of the board whose message ID is stored under the
+        configuration `key`, `build` returning its embeds.
+        """
+        self._pending[key] = (channel, build, None)
+        self._schedule(key)
+
+    def update_sections(self, key, channel, names, build):
+        """
+        Schedule a render of the sections `names` of the sharded board whose layout is
+        stored under the configuration `key`.
+
+        `build` takes a set of section names and returns a dict mapping each of them to
+        its embeds, in display order, leaving out the sections that no longer exist.
+        """
+        _, _, changed = self._pending.get(key, (None, None, None))
+        self._pending[key] = (channel, build, (changed or set()) | set(names))
+        self._schedule(key)
+
+    def sections(self, key):
+        """Names of the sections placed in a message of the sharded board `key`."""
+        return {name for shard in ConfigManager.get(key, []) for name in shard["sections"]}
+
+    def _schedule(self, key):
+        if key not in self._tasks:
+            self._tasks[key] = asyncio.create_task(self._flush(key))
+
+    async def _flush(self, key):
+        try:
+            await asyncio.sleep(self.delay)
+            channel, build, names = self._pending.pop(key)
+            if names is None:
+                await self.publish(key, channel, build())
+            else:
+                await self.publish_sections(key, channel, names, build)
+        except Exception:
+            logger.exception(f"Failed to update the {key} board")
+        finally:
+            del self._tasks[key]
+            # An update arrived while the edit was in flight
+            if key in self._pending:
+                self._schedule(key)
+
+    async def publish(self, key, channel, embeds):
+        """Send, edit or delete the board message so that it shows `embeds`."""
+        message_id = ConfigManager.get(key)
+        new_id = await self._publish_message(key, channel, message_id, embeds)
+        if new_id is None:
+            ConfigManager.remove(key)
+        elif new_id != message_id:
+            ConfigManager.set(key, new_id)
+
+    async def publish_sections(self, key, channel, names, build):
+        """Re-render the sections `names` and edit only the messages holding them."""
+        # Layout of the board: a list of {"message_ids": [...], "sections": [...]}, a
+        # section too large for one message spanning several consecutive ones
+        shards = ConfigManager.get(key, [])
+        owners = {name: shard for shard in shards for name in shard["sections"]}
+        touched = [shard for shard in shards if not names.isdisjoint(shard["sections"])]
+
+        # The sections sharing a message with a changed one are rendered again, as well
+        # as those of the last message, where new sections go
+        wanted = set(names)
+        for shard in touched + shards[-1:]:
+            wanted.update(shard["sections"])
+        rendered = build(wanted)
+
+        def shard_embeds(shard, extra=None):
+            sections = set(shard["sections"])
+            if extra is not None:
+                sections.add(extra)
+            return [
+                embed for name, embeds in rendered.items() if name in sections for embed in embeds
+            ]
+
+        homeless = []
+        for name in names:
+            if name not in owners:
+                if name in rendered:
+                    homeless.append(name)
+            elif name not in rendered:
+                owners[name]["sections"].remove(name)
+        # Sections that grew out of their message move to another one
+        for shard in touched:
+            while len(shard["sections"]) > 1 and not fits(shard_embeds(shard)):
+                homeless.append(shard["sections"].pop())
+
+        for name in homeless:
+            if not shards or not fits(shard_embeds(shards[-1], name)):
+                shards.append({"message_ids": [], "sections": []})
+            shards[-1]["sections"].append(name)
+            if not any(shard is shards[-1] for shard in touched):
+                touched.append(shards[-1])
+
+        # A shard needing more or fewer messages than it has shifts the messages after
+        # it, which are rendered again so the board stays in order
+        pages = {id(shard): paginate(shard_embeds(shard)) for shard in touched}
+        start = next(
+            (
+                i
+                for i, shard in enumerate(shards)
+                if id(shard) in pages and len(pages[id(shard)]) != len(shard["message_ids"])
+            ),
+            len(shards),
+        )
+        shifted = shards[start:]
+        missing = {name for shard in shifted for name in shard["sections"]} - wanted
+        if missing:
+            rendered.update(build(missing))
+        for shard in shifted:
+            if id(shard) not in pages:
+                pages[id(shard)] = paginate(shard_embeds(shard))
+
+        slots = deque()
+        try:
+            for shard in shards[:start]:
+                for i, page in enumerate(pages.get(id(shard), [])):
+                    shard["message_ids"][i] = await self._publish_message(
+                        key, channel, shard["message_ids"][i], page
+                    )
+
+            # The shifted shards take the messages from the first one in order, new
+            # messages being sent after them
+            for shard in shifted:
+                slots.extend(shard["message_ids"])
+                shard["message_ids"] = []
+            for shard in shifted:
+                for page in pages[id(shard)]:
+                    message_id = await self._publish_message(
+                        key, channel, slots[0] if slots else None, page
+                    )
+                    if slots:
+                        slots.popleft()
+                    shard["message_ids"].append(message_id)
+            # Messages left once the board shrank
+            while slots:
+                await self._publish_message(key, channel, slots[0], [])
+                slots.popleft()
+        finally:
+            # Messages not reassigned after a failure are kept, the next update reuses
+            # or deletes them
+            if slots:
+                shifted[-1]["message_ids"].extend(slots)
+            ConfigManager.set(key, [shard for shard in shards if shard["message_ids"]])
+
+    async def _publish_message(self, key, channel, message_id, embeds):
+        """
+        Send, edit or delete the message `message_id` so that it shows `embeds`, and
+        return the ID of the message now showing them, if any.
+        """
+        pages = paginate(embeds)
+        if len(pages) > 1:
+            logger.warning(f"The {key} board does not fit in one message, it is truncated")
+        embeds = pages[0] if pages else []
+
+        digest = payload_hash(embeds)
+        if message_id in self.boards and self._hashes.get(message_id) == digest:
+            # Nothing visible changed, and the message was not deleted meanwhile
+            return message_id
+
+        msg = None
+        if message_id:
+            with contextlib.suppress(NotFound):
+                msg = await self.boards.fetch(channel, message_id)
+
+        if not embeds:
+            if msg is not None:
+                await self.boards.delete(msg)
+                self._hashes.pop(msg.id, None)
+            return None
+        if msg is None:
+            msg = await self.boards.send(channel, embeds=embeds)
+        else:
+            await self.boards.edit(msg, embeds=embeds)
+        self._hashes[msg.id] = digest
+        return msg.id
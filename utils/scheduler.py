@@ -0,0 +1,125 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+from loguru import logger
+
+# Upper bound on a single sleep, so wall clock adjustments are picked up eventually
+MAX_SLEEP = 3600
+# First delay (in seconds) before firing a key again after its callback failed, doubled
+# on every consecutive failure
+RETRY_DELAY = 30
+MAX_RETRY_DELAY = 3600
+
+
+class TimerHeap:
+    """
+    Min-heap of absolute deadlines (epoch seconds) driving a single sleeping task.
+
+    Each key has at most one pending deadline. Rescheduling or cancelling a key only
+    flags its previous heap entry, which is dropped when it reaches the top, so every
+    operation is O(log n) and a wake-up only touches the entries that are due.
+
+    A key whose callback fails without scheduling it again is fired again later, with
+    an exponential backoff, so a transient error doesn't drop it.
+    """
+
+    def __init__(self, callback):
+        # Awaited as `callback(key, payload)` once the deadline of `key` is reached
+        self.callback = callback
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+        # Consecutive callback failures of the keys being retried
+        self._failures = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def schedule(self, key, deadline, payload=None):
+        """Schedule (or reschedule) `key` to fire at `deadline`."""
+        self.cancel(key)
+        entry = [deadline, next(self._counter), key, payload, True]
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            # The earliest deadline changed, let the sleeping task recompute its delay
+            self._wakeup.set()
+
+    def cancel(self, key):
+        self._failures.pop(key, None)
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            entry[-1] = False
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _next_deadline(self):
+        while self._heap and not self._heap[0][-1]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    async def _run(self):
+        while True:
+            deadline = self._next_deadline()
+            timeout = MAX_SLEEP if deadline is None else min(deadline - time.time(), MAX_SLEEP)
+
+            self._wakeup.clear()
+            if timeout > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                    continue
+                except TimeoutError:
+                    pass
+
+            now = time.time()
+            while (deadline := self._next_deadline()) is not None and deadline <= now:
+                _, _, key, payload, _ = heapq.heappop(self._heap)
+                del self._entries[key]
+                try:
+                    await self.callback(key, payload)
+                except Exception:
+                    failures = self._failures.get(key, 0) + 1
+                    delay = min(RETRY_DELAY * 2 ** (failures - 1), MAX_RETRY_DELAY)
+                    logger.exception(f"Timer callback failed for {key!r}, retry in {delay} s")
+                    if key not in self._entries:
+                        self.schedule(key, time.time() + delay, payload)
+                        self._failures[key] = failures
+                else:
+                    self._failures.pop(key, None)
+
+
+class TokenBucket:
+    """
+    Budget of `capacity` operations refilled at `rate` operations per second, allowing
+    short bursts while capping the long term rate.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def take(self):
+        """Spend one token, or return the seconds to wait until one is available."""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+        return (1 - self._tokens) / self.rate
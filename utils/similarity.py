@@ -0,0 +1,109 @@
+import hashlib
+import random
+import re
+import time
+from collections import deque
+
+from utils.autocomplete import normalize
+
+# Number of hash functions of a MinHash signature
+PERMUTATIONS = 32
+# Mersenne prime used by the hash functions, larger than any 32 bit feature hash
+PRIME = (1 << 61) - 1
+
+WORD = re.compile(r"\w{3,}")
+
+# Fixed seed, signatures must stay comparable across restarts
+_random = random.Random(0x5EED)
+_COEFFICIENTS = [
+    (_random.randrange(1, PRIME), _random.randrange(0, PRIME)) for _ in range(PERMUTATIONS)
+]
+
+
+def features(text):
+    """Distinct words of `text`, case and accent folded."""
+    return set(WORD.findall(normalize(text)))
+
+
+def minhash(text):
+    """MinHash signature of the words of `text`, None if it has none."""
+    hashes = [
+        int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=4).digest())
+        for feature in features(text)
+    ]
+    if not hashes:
+        return None
+    return tuple(min((a * h + b) % PRIME for h in hashes) for a, b in _COEFFICIENTS)
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of the texts behind two signatures."""
+    return sum(x == y for x, y in zip(a, b, strict=True)) / PERMUTATIONS
+
+
+def bands_for(threshold):
+    """Number of LSH bands whose candidate threshold is closest to `threshold`."""
+    splits = [bands for bands in range(1, PERMUTATIONS + 1) if PERMUTATIONS % bands == 0]
+    # Signatures sharing a band are candidates, which is likely above (1 / b) ** (1 / r)
+    return min(
+        splits,
+        key=lambda bands: abs((1 / bands) ** (bands / PERMUTATIONS) - threshold),
+    )
+
+
+class NearDuplicateIndex:
+    """
+    Index of recent MinHash signatures answering "was something similar seen lately?".
+
+    Signatures are split into bands, and only the signatures sharing a band with the
+    query are compared, so a lookup does not depend on the size of the window. Items
+    older than `window` seconds are forgotten.
+    """
+
+    def __init__(self, threshold=0.6, window=48 * 3600):
+        self.threshold = threshold
+        self.window = window
+        self.bands = bands_for(threshold)
+        self._rows = PERMUTATIONS // self.bands
+        # (band, band values) -> [(signature, item)], oldest first
+        self._buckets = {}
+        # (timestamp, signature), oldest first
+        self._items = deque()
+
+    def __len__(self):
+        return len(self._items)
+
+    def _keys(self, signature):
+        rows = self._rows
+        return [(band, signature[band * rows : (band + 1) * rows]) for band in range(self.bands)]
+
+    def add(self, signature, item, now=None):
+        now = now if now is not None else time.time()
+        self._expire(now)
+        self._items.append((now, signature))
+        for key in self._keys(signature):
+            self._buckets.setdefault(key, []).append((signature, item))
+
+    def find(self, signature, where=None, now=None):
+        """The item most similar to `signature` above the threshold, if any."""
+        self._expire(now if now is not None else time.time())
+        best, best_score = None, self.threshold
+        for key in self._keys(signature):
+            for other, item in self._buckets.get(key, ()):
+                score = similarity(signature, other)
+                # On a tie, the oldest item wins
+                if (score > best_score or best is None and score == best_score) and (
+                    where is None or where(item)
+                ):
+                    best, best_score = item, score
+        return best
+
+    def _expire(self, now):
+        while self._items and self._items[0][0] < now - self.window:
+            _, signature = self._items.popleft()
+            for key in self._keys(signature):
+                # Buckets are filled in time order too, the expired item comes first
+                bucket = self._buckets[key]
+                del bucket[0]
+                if not bucket:
+                    del self._buckets[key]